@@ -0,0 +1,128 @@
+import statistics
+import time
+import typing as t
+
+BENCH_WORDS = (
+    "analisis agua suelo quimica fisica biologia microbiologia genetica "
+    "alimentos ambiental calidad control ensayo medicion calibracion "
+    "consultoria desarrollo software sistemas datos energia materiales "
+    "metales polimeros residuos toxicologia clinica veterinaria semillas "
+    "laboratorio muestras certificacion normas auditoria capacitacion "
+    "investigacion innovacion prototipo diseño electronica mecanica optica"
+).split()
+
+BENCH_QUERIES = (
+    "agua",
+    "analisis agua",
+    '"control de calidad"',
+    "la",
+    "microbiologia -clinica",
+)
+
+
+def _median_ms(func: t.Callable[[], t.Any], repeat: int) -> float:
+    timings: t.List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
+
+
+def bench_search(services: int, repeat: int) -> None:
+    """Times the service search over a synthetic catalog.
+
+    The catalog is created inside a transaction that is rolled back at the
+    end, so the database is left untouched. Every query is timed with the
+    ranking of every match and with the bounded ranking of the service
+    search. Both load the first page of visible services and their total
+    with the same weighted vector and rank normalization, without the
+    search cache and the facets, so they only differ in the ranking.
+    """
+    import sqlalchemy as sa
+
+    from src.core.db import db
+    from src.core.models.service import Service
+    from src.services import pagination
+    from src.services.service import SEARCH_RANK_NORMALIZATION, ServiceService
+    from src.utils.tsquery import compile_tsquery
+
+    try:
+        institution_id = db.session.execute(
+            sa.text(
+                "INSERT INTO institutions (name, information, address, "
+                "location, web, keywords, email, days_and_opening_hours, "
+                "enabled, created_at) "
+                "VALUES ('bench', '', '', '', '', '', '', '', true, now()) "
+                "RETURNING id"
+            )
+        ).scalar_one()
+        db.session.execute(
+            sa.text(
+                "INSERT INTO services (name, laboratory, description, "
+                "keywords, service_type, institution_id, enabled, created_at) "
+                "SELECT "
+                "w[1 + floor(random() * n)::int] || ' ' "
+                "|| w[1 + floor(random() * n)::int], "
+                "'lab ' || w[1 + floor(random() * n)::int], "
+                "w[1 + floor(random() * n)::int] || ' de ' "
+                "|| w[1 + floor(random() * n)::int] || ' y ' "
+                "|| w[1 + floor(random() * n)::int] || ' para ' "
+                "|| w[1 + floor(random() * n)::int], "
+                "w[1 + floor(random() * n)::int] || ' ' "
+                "|| w[1 + floor(random() * n)::int], "
+                "CAST((ARRAY['ANALYSIS', 'CONSULTANCY', 'DEVELOPMENT'])"
+                "[1 + i % 3] AS servicetypes), "
+                ":institution_id, true, now() "
+                "FROM generate_series(1, :services) AS i, "
+                "(SELECT CAST(:words AS text[]) AS w, :n AS n) AS vocabulary"
+            ),
+            {
+                "institution_id": institution_id,
+                "services": services,
+                "words": list(BENCH_WORDS),
+                "n": len(BENCH_WORDS),
+            },
+        )
+        db.session.execute(sa.text("ANALYZE services"))
+        print(f"[info]: {services} synthetic services created")
+
+        for q in BENCH_QUERIES:
+            tsquery = compile_tsquery(q)
+            matches = db.session.execute(
+                sa.text(
+                    "SELECT count(*) FROM services "
+                    "WHERE visible "
+                    "AND search_tsv @@ to_tsquery('argentino', :q)"
+                ),
+                {"q": tsquery},
+            ).scalar_one()
+            ts_query = sa.func.to_tsquery("argentino", tsquery)
+            full_rank = (
+                db.session.query(Service)
+                .filter(Service.visible, Service.search_tsv.op("@@")(ts_query))
+                .order_by(
+                    sa.func.ts_rank(
+                        Service.search_tsv, ts_query, SEARCH_RANK_NORMALIZATION
+                    ).desc(),
+                    Service.id,
+                )
+            )
+
+            def run_full() -> None:
+                pagination.paginate(full_rank, 1, 10, True)
+
+            def run_bounded() -> None:
+                ServiceService._search_services(  # pyright: ignore
+                    tsquery, None, None, 1, 10, True, False
+                )
+
+            full_ms = _median_ms(run_full, repeat)
+            bounded_ms = _median_ms(run_bounded, repeat)
+            print(
+                f"[info]: {q!r} ({matches} matches) "
+                f"full rank {full_ms:.1f}ms, bounded rank {bounded_ms:.1f}ms"
+            )
+    finally:
+        db.session.rollback()
@@ -1,6 +1,7 @@
+import contextlib
 import typing as t
 
-from flask import Flask
+from flask import Flask, Response
 from flask_sqlalchemy import SQLAlchemy
 
 from src.core.models import all_models  # pyright: ignore # noqa: F401
@@ -9,6 +10,8 @@ from src.core.models import base
 db = SQLAlchemy(model_class=base.BaseModel)
 # db = SQLAlchemy(model_class=base.BaseModel, engine_options={"echo": True})
 
+_TRANSACTION_DEPTH = "transaction_depth"
+
 
 def init_app(app: Flask) -> None:
     db.init_app(app)
@@ -16,6 +19,14 @@ def init_app(app: Flask) -> None:
 
 
 def config_db(app: Flask) -> None:
+    @app.after_request
+    def commit_session(response: Response) -> Response:
+        # The request is the unit of work, the services only flush their
+        # changes. Error responses and unhandled exceptions discard them.
+        if response.status_code < 400:
+            db.session.commit()
+        return response
+
     @app.teardown_request
     def close_session(exception: t.Union[BaseException, None] = None):
         db.session.close()
@@ -28,3 +39,25 @@ def reset_db() -> None:
     """
     db.drop_all()
     db.create_all()
+
+
+@contextlib.contextmanager
+def transaction() -> t.Iterator[None]:
+    """Unit of work for changes made outside of a request, like in the CLI
+    commands, or that must be committed before the request ends.
+
+    Commits the changes when the block finishes or rolls them back if it
+    raises. Nested blocks are part of the outermost one.
+    """
+    depth = db.session.info.get(_TRANSACTION_DEPTH, 0)
+    db.session.info[_TRANSACTION_DEPTH] = depth + 1
+    try:
+        yield
+        if depth == 0:
+            db.session.commit()
+    except BaseException:
+        if depth == 0:
+            db.session.rollback()
+        raise
+    finally:
+        db.session.info[_TRANSACTION_DEPTH] = depth
@@ -31,3 +31,21 @@ class RequestStatus(Enum):
 class RegisterTypes(Enum):
     GOOGLE = "Google"
     MANUAL = "Manual"
+
+
+class MailStatus(Enum):
+    PENDING = "Pendiente"
+    SENT = "Enviado"
+    FAILED = "Fallido"
+
+
+class PurgeTarget(Enum):
+    INSTITUTION = "Institución"
+    SERVICE = "Servicio"
+    USER = "Usuario"
+
+
+class PurgeStatus(Enum):
+    PENDING = "Pendiente"
+    DONE = "Finalizada"
+    FAILED = "Fallida"
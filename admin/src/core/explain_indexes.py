@@ -0,0 +1,290 @@
+import contextlib
+import typing as t
+
+LARGE_TABLES = (
+    "service_requests",
+    "request_notes",
+    "request_history",
+    "users",
+    "users_institutions_roles",
+)
+"""Tables that must never be read by a sequential scan."""
+
+
+class IndexCheck(t.NamedTuple):
+    """Service call whose statements must use the `indexes`.
+
+    Attributes:
+        name: The name printed in the report.
+        call: Runs the service call, receives the ids of the synthetic
+            rows.
+        indexes: The index names that must appear in the plans.
+    """
+
+    name: str
+    call: t.Callable[[t.Dict[str, int]], t.Any]
+    indexes: t.Tuple[str, ...]
+
+
+def _checks() -> t.List[IndexCheck]:
+    from src.services.membership import MembershipService
+    from src.services.request import RequestService
+    from src.services.user import UserService
+
+    return [
+        IndexCheck(
+            "service requests, keyset page",
+            lambda ids: RequestService.get_requests_filter_by_service_keyset(
+                cursor=None,
+                per_page=10,
+                institution_id=ids["institution_id"],
+                service_id=ids["service_id"],
+            ),
+            ("idx_service_requests_service_keyset",),
+        ),
+        IndexCheck(
+            "user requests, keyset page",
+            lambda ids: RequestService.get_requests_by_user_keyset(
+                ids["user_id"]
+            ),
+            ("idx_service_requests_user_keyset",),
+        ),
+        IndexCheck(
+            "request notes with users",
+            lambda ids: RequestService.get_requests_notes_with_users(
+                ids["request_id"]
+            ),
+            ("idx_request_notes_request_created",),
+        ),
+        IndexCheck(
+            "request notes with users, keyset page",
+            lambda ids: RequestService.get_requests_notes_with_users_keyset(
+                ids["request_id"]
+            ),
+            ("idx_request_notes_request_created",),
+        ),
+        IndexCheck(
+            "request timeline",
+            lambda ids: RequestService.get_request_timeline(ids["request_id"]),
+            (
+                "idx_request_notes_request_created",
+                "idx_request_history_request_created",
+            ),
+        ),
+        IndexCheck(
+            "request timeline, next page",
+            lambda ids: RequestService.get_request_timeline(
+                ids["request_id"],
+                cursor=RequestService.get_request_timeline(
+                    ids["request_id"], per_page=1
+                )[1],
+                per_page=1,
+            ),
+            (
+                "idx_request_notes_request_created",
+                "idx_request_history_request_created",
+            ),
+        ),
+        IndexCheck(
+            "user membership",
+            lambda ids: MembershipService._load_membership(  # pyright: ignore
+                ids["user_id"]
+            ),
+            (),
+        ),
+        IndexCheck(
+            "users by email substring",
+            lambda ids: UserService.filter_users_by_email_and_active(
+                f"-{ids['users'] // 2}@", None
+            ),
+            ("idx_users_email_trgm",),
+        ),
+    ]
+
+
+@contextlib.contextmanager
+def _capture_statements(
+    connection: t.Any,
+) -> t.Iterator[t.List[t.Tuple[str, t.Any]]]:
+    import sqlalchemy as sa
+
+    statements: t.List[t.Tuple[str, t.Any]] = []
+
+    def before_cursor_execute(
+        conn: t.Any,
+        cursor: t.Any,
+        statement: str,
+        parameters: t.Any,
+        context: t.Any,
+        executemany: bool,
+    ) -> None:
+        statements.append((statement, parameters))
+
+    sa.event.listen(connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(
+            connection, "before_cursor_execute", before_cursor_execute
+        )
+
+
+def _plan_nodes(plan: t.Dict[str, t.Any]) -> t.Iterator[t.Dict[str, t.Any]]:
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _plan_nodes(child)
+
+
+def _seed(requests: int) -> t.Dict[str, int]:
+    import sqlalchemy as sa
+
+    from src.core.db import db
+    from src.core.enums import DocumentTypes, GenderOptions, RequestStatus
+
+    institution_id = db.session.execute(
+        sa.text(
+            "INSERT INTO institutions (name, information, address, "
+            "location, web, keywords, email, days_and_opening_hours, "
+            "enabled, created_at) "
+            "VALUES ('explain', '', '', '', '', '', '', '', true, now()) "
+            "RETURNING id"
+        )
+    ).scalar_one()
+    role_id = db.session.execute(
+        sa.text("INSERT INTO roles (name) VALUES ('explain') RETURNING id")
+    ).scalar_one()
+    params = {
+        "institution_id": institution_id,
+        "role_id": role_id,
+        "services": 50,
+        "users": max(requests // 10, 1),
+        "requests": requests,
+        "document_type": DocumentTypes.DNI.name,
+        "gender": GenderOptions.OTHER.name,
+        "status": RequestStatus.IN_PROCESS.name,
+    }
+    statements = (
+        "INSERT INTO services (name, laboratory, description, keywords, "
+        "service_type, institution_id, enabled, created_at) "
+        "SELECT 'explain ' || i, 'lab', '', '', "
+        "CAST('ANALYSIS' AS servicetypes), :institution_id, true, now() "
+        "FROM generate_series(1, :services) AS i",
+        "INSERT INTO users (firstname, lastname, password, email, username, "
+        "document_type, document_number, gender, address, phone, "
+        "is_active) "
+        "SELECT 'explain', 'explain', '', "
+        "'explain-' || i || '@example.com', 'explain-' || i, "
+        "CAST(:document_type AS documenttypes), i::text, "
+        "CAST(:gender AS genderoptions), '', '', true "
+        "FROM generate_series(1, :users) AS i",
+        "INSERT INTO users_institutions_roles (user_id, institution_id, "
+        "role_id) "
+        "SELECT id, :institution_id, :role_id FROM users "
+        "WHERE email LIKE 'explain-%@example.com'",
+        "INSERT INTO service_requests (title, description, status, "
+        "created_at, institution_id, user_id, service_id) "
+        "SELECT 'explain', '', CAST(:status AS requeststatus), "
+        "now() - i * interval '1 minute', :institution_id, "
+        "u.ids[1 + i % cardinality(u.ids)], "
+        "s.ids[1 + i % cardinality(s.ids)] "
+        "FROM generate_series(1, :requests) AS i, "
+        "(SELECT array_agg(id) AS ids FROM users "
+        "WHERE email LIKE 'explain-%@example.com') AS u, "
+        "(SELECT array_agg(id) AS ids FROM services "
+        "WHERE institution_id = :institution_id) AS s",
+        "INSERT INTO request_notes (note, created_at, service_request_id, "
+        "user_id) "
+        "SELECT 'explain', r.created_at + n * interval '1 second', r.id, "
+        "r.user_id "
+        "FROM service_requests AS r, generate_series(1, 2) AS n "
+        "WHERE r.institution_id = :institution_id",
+        "INSERT INTO request_history (status, observations, created_at, "
+        "service_request_id) "
+        "SELECT r.status, '', r.created_at + n * interval '1 second', r.id "
+        "FROM service_requests AS r, generate_series(1, 2) AS n "
+        "WHERE r.institution_id = :institution_id",
+    )
+    for statement in statements:
+        db.session.execute(sa.text(statement), params)
+    for table in LARGE_TABLES:
+        db.session.execute(sa.text(f"ANALYZE {table}"))
+
+    service_id, user_id, request_id = db.session.execute(
+        sa.text(
+            "SELECT service_id, user_id, id FROM service_requests "
+            "WHERE institution_id = :institution_id LIMIT 1"
+        ),
+        params,
+    ).one()
+
+    return {
+        "institution_id": institution_id,
+        "service_id": service_id,
+        "user_id": user_id,
+        "request_id": request_id,
+        "users": params["users"],
+    }
+
+
+def explain_indexes(requests: int) -> bool:
+    """Checks that the main service queries are served by their indexes.
+
+    A synthetic institution with `requests` service requests, their notes,
+    history and users is created inside a transaction that is rolled back
+    at the end, so the database is left untouched. The statements run by
+    every check are captured and explained, a check fails if a plan reads
+    one of `LARGE_TABLES` with a sequential scan or doesn't use one of its
+    indexes.
+
+    Returns:
+        Whether every check passed.
+    """
+    import json
+
+    import sqlalchemy as sa
+
+    from src.core.db import db
+
+    passed = True
+    try:
+        ids = _seed(requests)
+        print(f"[info]: {requests} synthetic service requests created")
+
+        connection = db.session.connection()
+        for check in _checks():
+            with _capture_statements(connection) as statements:
+                check.call(ids)
+
+            used: t.Set[str] = set()
+            scanned: t.Set[str] = set()
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    continue
+                plan = connection.exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {statement}", parameters
+                ).scalar_one()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                for node in _plan_nodes(plan[0]["Plan"]):
+                    if "Index Name" in node:
+                        used.add(node["Index Name"])
+                    if node["Node Type"] == "Seq Scan":
+                        scanned.add(node["Relation Name"])
+
+            missing = [index for index in check.indexes if index not in used]
+            seq_scans = sorted(scanned.intersection(LARGE_TABLES))
+            if missing or seq_scans:
+                passed = False
+                print(
+                    f"[error]: {check.name}: missing indexes {missing}, "
+                    f"sequential scans on {seq_scans}"
+                )
+            else:
+                print(f"[success]: {check.name}: {sorted(used)}")
+    except sa.exc.SQLAlchemyError as e:
+        passed = False
+        print(f"[error]: {e}")
+    finally:
+        db.session.rollback()
+
+    return passed
@@ -1,6 +1,8 @@
 from src.core.models import (
     auth,
     institution,
+    mail,
+    purge,
     service,
     service_requests,
     site,
@@ -10,6 +12,8 @@ from src.core.models import (
 __all__ = [
     "auth",
     "institution",
+    "mail",
+    "purge",
     "service",
     "service_requests",
     "site",
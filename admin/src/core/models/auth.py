@@ -9,27 +9,43 @@ class UserInstitutionRole(base.BaseModel):
     __tablename__ = "users_institutions_roles"
 
     id: sao.Mapped[int] = sao.mapped_column(primary_key=True, init=False)
-    user_id: sao.Mapped[int]
-    institution_id: sao.Mapped[int]
-    role_id: sao.Mapped[int]
-
-    __table_args__ = (sa.UniqueConstraint("user_id", "institution_id"),)
+    user_id: sao.Mapped[int] = sao.mapped_column(sa.ForeignKey("users.id"))
+    institution_id: sao.Mapped[int] = sao.mapped_column(
+        sa.ForeignKey("institutions.id")
+    )
+    role_id: sao.Mapped[int] = sao.mapped_column(sa.ForeignKey("roles.id"))
+
+    # The unique constraint also serves the lookups by user
+    __table_args__ = (
+        sa.UniqueConstraint("user_id", "institution_id"),
+        sa.Index(
+            "idx_users_institutions_roles_institution_role",
+            "institution_id",
+            "role_id",
+        ),
+    )
 
 
 class SiteAdmin(base.BaseModel):
     __tablename__ = "site_admins"
 
     id: sao.Mapped[int] = sao.mapped_column(primary_key=True, init=False)
-    user_id: sao.Mapped[int] = sao.mapped_column(unique=True)
-    role_id: sao.Mapped[int]
+    user_id: sao.Mapped[int] = sao.mapped_column(
+        sa.ForeignKey("users.id"), unique=True
+    )
+    role_id: sao.Mapped[int] = sao.mapped_column(sa.ForeignKey("roles.id"))
 
 
 class RolePermission(base.BaseModel):
     __tablename__ = "roles_permissions"
 
     id: sao.Mapped[int] = sao.mapped_column(primary_key=True, init=False)
-    role_id: sao.Mapped[int]
-    permission_id: sao.Mapped[int]
+    role_id: sao.Mapped[int] = sao.mapped_column(sa.ForeignKey("roles.id"))
+    permission_id: sao.Mapped[int] = sao.mapped_column(
+        sa.ForeignKey("permissions.id")
+    )
+
+    __table_args__ = (sa.UniqueConstraint("role_id", "permission_id"),)
 
 
 class Role(base.BaseModel):
@@ -1,6 +1,6 @@
 import dataclasses
 import typing as t
-from datetime import datetime
+from datetime import datetime, timezone
 
 from sqlalchemy import DateTime, String, orm, sql
 from typing_extensions import Annotated
@@ -49,7 +49,7 @@ CreatedAt = Annotated[
     orm.mapped_column(
         DateTime(timezone=True),
         nullable=False,
-        default=datetime.utcnow,  # pyright: ignore[reportDeprecated]
+        default=lambda: datetime.now(timezone.utc),
     ),
 ]
 UpdatedAt = Annotated[
@@ -0,0 +1,44 @@
+"""Model for the mail outbox."""
+
+import typing as t
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, Text, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.enums import MailStatus
+from src.core.models.base import BaseModel, CreatedAt, IntPK, Str256, Str512
+
+
+class MailOutbox(BaseModel):
+    __tablename__ = "mail_outbox"
+
+    id: Mapped[IntPK] = mapped_column(init=False)
+    subject: Mapped[Str256]
+    recipients: Mapped[Str256]
+    html: Mapped[str] = mapped_column(Text)
+
+    status: Mapped[MailStatus] = mapped_column(
+        init=False, default=MailStatus.PENDING
+    )
+    attempts: Mapped[int] = mapped_column(init=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), init=False, insert_default=func.now()
+    )
+    last_error: Mapped[t.Optional[Str512]] = mapped_column(
+        init=False, default=None
+    )
+    sent_at: Mapped[t.Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), init=False, default=None
+    )
+
+    created_at: Mapped[CreatedAt] = mapped_column(init=False)
+
+    __table_args__ = (
+        # Pending mails are claimed in order of their next attempt
+        Index(
+            "idx_mail_outbox_pending",
+            "next_attempt_at",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
@@ -0,0 +1,60 @@
+"""Model for the purge jobs of deleted entities."""
+
+import typing as t
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.enums import PurgeStatus, PurgeTarget
+from src.core.models.base import BaseModel, CreatedAt, IntPK, Str512
+
+
+class PurgeJob(BaseModel):
+    """Deletion of an entity and its dependents, processed in batches.
+
+    A pending job marks its target as pending deletion.
+    """
+
+    __tablename__ = "purge_jobs"
+
+    id: Mapped[IntPK] = mapped_column(init=False)
+    target: Mapped[PurgeTarget]
+    target_id: Mapped[int]
+    total_rows: Mapped[int]
+    """Estimated rows to delete, counted when the job was created."""
+
+    status: Mapped[PurgeStatus] = mapped_column(
+        init=False, default=PurgeStatus.PENDING
+    )
+    deleted_rows: Mapped[int] = mapped_column(init=False, default=0)
+    attempts: Mapped[int] = mapped_column(init=False, default=0)
+    """Failed batches, the job fails after `PURGE_MAX_ATTEMPTS`."""
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), init=False, server_default=func.now()
+    )
+    last_error: Mapped[t.Optional[Str512]] = mapped_column(
+        init=False, default=None
+    )
+    finished_at: Mapped[t.Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), init=False, default=None
+    )
+
+    created_at: Mapped[CreatedAt] = mapped_column(init=False)
+
+    __table_args__ = (
+        # One pending job per target, claimed in order of their next attempt
+        Index(
+            "idx_purge_jobs_pending_target",
+            "target",
+            "target_id",
+            unique=True,
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+        Index(
+            "idx_purge_jobs_pending",
+            "next_attempt_at",
+            "id",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
@@ -7,6 +7,8 @@
 import sqlalchemy as sa
 from sqlalchemy.dialects.postgresql import TSVECTOR
 
+from src.core.models.base import BaseModel
+
 
 class TSVectorType(sa.types.TypeDecorator):
     """
@@ -115,16 +117,32 @@ class TSVectorType(sa.types.TypeDecorator):
         super().__init__()
 
 
+SEARCH_SETUP_DDL = sa.DDL(
+    """
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'argentino') THEN
+    CREATE TEXT SEARCH CONFIGURATION argentino ( COPY = simple );
+    ALTER TEXT SEARCH CONFIGURATION argentino
+      ALTER MAPPING FOR hword, hword_part, word
+      WITH unaccent, simple;
+  END IF;
+END
+$$;
 """
-Must execute this command in postgresql:
-
-CREATE EXTENSION unaccent; -- still required it plugs into FTS.
+)
+"""
+Provisions the extensions and the `argentino` text search configuration
+before the tables are created:
 
-CREATE TEXT SEARCH CONFIGURATION argentino ( COPY = simple );
-ALTER TEXT SEARCH CONFIGURATION argentino
-  ALTER MAPPING FOR hword, hword_part, word
-  WITH unaccent, simple;
+- `unaccent`: still required it plugs into FTS.
+- `pg_trgm`: trigram operator classes for the substring (ILIKE) indexes.
+- `argentino`: case and accent insensitive configuration.
 
 from stackexchange:
 https://dba.stackexchange.com/questions/177020/creating-a-case-insensitive-and-accent-diacritics-insensitive-search-on-a-field
 """
+
+sa.event.listen(BaseModel.metadata, "before_create", SEARCH_SETUP_DDL)
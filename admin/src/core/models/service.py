@@ -1,3 +1,6 @@
+import typing as t
+from datetime import datetime
+
 import sqlalchemy as sa
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -14,6 +17,17 @@ from src.core.models.base import (
 )
 from src.core.models.search import TSVectorType
 
+SEARCH_TSV_EXPRESSION = (
+    "setweight(to_tsvector('argentino', \"name\"), 'A') || "
+    "setweight(to_tsvector('argentino', \"keywords\"), 'B') || "
+    "setweight(to_tsvector('argentino', \"laboratory\"), 'C') || "
+    "setweight(to_tsvector('argentino', \"description\"), 'D')"
+)
+"""Weighted search vector, matches in the name rank first."""
+
+SEARCH_TRGM_EXPRESSION = 'lower("name" || \' \' || "keywords")'
+"""Text compared by similarity when the full text search finds nothing."""
+
 
 class Service(BaseModel):
     __tablename__ = "services"
@@ -25,7 +39,9 @@ class Service(BaseModel):
     keywords: Mapped[Str256]
     service_type: Mapped[ServiceTypes]
 
-    institution_id: Mapped[int]
+    institution_id: Mapped[int] = mapped_column(
+        sa.ForeignKey("institutions.id")
+    )
 
     created_at: Mapped[CreatedAt] = mapped_column(init=False)
     updated_at: Mapped[UpdatedAt] = mapped_column(
@@ -33,6 +49,20 @@ class Service(BaseModel):
     )
 
     enabled: Mapped[bool] = mapped_column(default=True)
+    visible: Mapped[bool] = mapped_column(
+        init=False, default=True, server_default=sa.true()
+    )
+    """Whether the service is shown in the public search, both the service
+    and its institution are enabled. Maintained by the services."""
+
+    request_count: Mapped[int] = mapped_column(
+        init=False, default=0, server_default="0"
+    )
+    last_requested_at: Mapped[t.Optional[datetime]] = mapped_column(
+        sa.DateTime(timezone=True), init=False
+    )
+    """Denormalized from the service requests, maintained by the request
+    service."""
 
     search_tsv = sa.Column(  # pyright: ignore[reportUnknownVariableType]
         TSVectorType(
@@ -42,24 +72,43 @@ class Service(BaseModel):
             "keywords",
             regconfig="argentino",
         ),
-        sa.Computed(
-            "to_tsvector('argentino', \"name\" || ' ' || \"laboratory\" || ' ' || \"description\" || ' ' || \"keywords\")",  # noqa E501
-            persisted=True,
-        ),
+        sa.Computed(SEARCH_TSV_EXPRESSION, persisted=True),
     )
     #   equivalent to:
     #   COLUMN search_tsv TSVECTOR GENERATED ALWAYS AS (
-    #       to_tsvector(
-    #           'argentino',
-    #           "name" || ' ' || "laboratory" || ' ' || "description" || ' ' || "keywords" # noqa E501
-    #       )
+    #       setweight(to_tsvector('argentino', "name"), 'A') ||
+    #       setweight(to_tsvector('argentino', "keywords"), 'B') ||
+    #       setweight(to_tsvector('argentino', "laboratory"), 'C') ||
+    #       setweight(to_tsvector('argentino', "description"), 'D')
     #   ) STORED;
 
+    search_trgm = sa.Column(  # pyright: ignore[reportUnknownVariableType]
+        sa.Text,
+        sa.Computed(SEARCH_TRGM_EXPRESSION, persisted=True),
+    )
+
     __table_args__ = (
-        # Indexing the TSVector column
+        # Indexing the TSVector column, only the visible services are
+        # searched
         sa.Index(
             "idx_service_search_tsv",
             search_tsv,  # pyright: ignore[reportUnknownArgumentType]
             postgresql_using="gin",
+            postgresql_where=sa.text("visible"),
+        ),
+        # Trigram similarity of the name and keywords, fuzzy search
+        sa.Index(
+            "idx_services_search_trgm",
+            search_trgm,  # pyright: ignore[reportUnknownArgumentType]
+            postgresql_using="gin",
+            postgresql_ops={"search_trgm": "gin_trgm_ops"},
+            postgresql_where=sa.text("visible"),
+        ),
+        sa.Index("idx_services_institution", "institution_id"),
+        # Most requested services ranking
+        sa.Index(
+            "idx_services_request_count",
+            "request_count",
+            "last_requested_at",
         ),
     )
@@ -1,7 +1,9 @@
 """Model for service request."""
 
 import typing as t
+from datetime import datetime
 
+from sqlalchemy import DateTime, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 
@@ -12,7 +14,6 @@ from src.core.models.base import (
     IntPK,
     Str32,
     Str512,
-    Timestamp,
     UpdatedAt,
 )
 
@@ -24,16 +25,40 @@ class ServiceRequest(BaseModel):
     title: Mapped[Str32]
     description: Mapped[Str512]
     status: Mapped[RequestStatus]
-    closed_at: Mapped[t.Optional[Timestamp]] = mapped_column(init=False)
+    closed_at: Mapped[t.Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), init=False
+    )
+    """When the request reached a terminal status, set by the request
+    service."""
 
     created_at: Mapped[CreatedAt] = mapped_column(init=False)
     updated_at: Mapped[UpdatedAt] = mapped_column(
         init=False, onupdate=func.current_timestamp()
     )
 
-    institution_id: Mapped[int]
-    user_id: Mapped[int]
-    service_id: Mapped[int]
+    institution_id: Mapped[int] = mapped_column(ForeignKey("institutions.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    service_id: Mapped[int] = mapped_column(ForeignKey("services.id"))
+
+    __table_args__ = (
+        # Requests of a service and of a user, read in the `(created_at, id)`
+        # order of their keyset pages
+        Index(
+            "idx_service_requests_service_keyset",
+            "institution_id",
+            "service_id",
+            "created_at",
+            "id",
+        ),
+        Index(
+            "idx_service_requests_user_keyset",
+            "user_id",
+            "created_at",
+            "id",
+        ),
+        # Joins from services and deletion of a service requests
+        Index("idx_service_requests_service", "service_id"),
+    )
 
 
 class RequestNote(BaseModel):
@@ -47,8 +72,19 @@ class RequestNote(BaseModel):
         init=False, onupdate=func.current_timestamp()
     )
 
-    service_request_id: Mapped[int]
-    user_id: Mapped[int]
+    service_request_id: Mapped[int] = mapped_column(
+        ForeignKey("service_requests.id", ondelete="CASCADE")
+    )
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+
+    __table_args__ = (
+        Index(
+            "idx_request_notes_request_created",
+            "service_request_id",
+            "created_at",
+        ),
+        Index("idx_request_notes_user", "user_id"),
+    )
 
 
 class RequestHistory(BaseModel):
@@ -62,4 +98,50 @@ class RequestHistory(BaseModel):
     updated_at: Mapped[UpdatedAt] = mapped_column(
         init=False, onupdate=func.current_timestamp()
     )
-    service_request_id: Mapped[int]
+    service_request_id: Mapped[int] = mapped_column(
+        ForeignKey("service_requests.id", ondelete="CASCADE")
+    )
+
+    __table_args__ = (
+        Index(
+            "idx_request_history_request_created",
+            "service_request_id",
+            "created_at",
+        ),
+    )
+
+
+class RequestStatusCounter(BaseModel):
+    """Rollup of the amount of service requests per status.
+
+    Maintained by the request service in the same transaction that creates
+    or changes the status of a request.
+    """
+
+    __tablename__ = "request_status_counters"
+
+    institution_id: Mapped[int] = mapped_column(
+        ForeignKey("institutions.id", ondelete="CASCADE"), primary_key=True
+    )
+    service_id: Mapped[int] = mapped_column(
+        ForeignKey("services.id", ondelete="CASCADE"), primary_key=True
+    )
+    status: Mapped[RequestStatus] = mapped_column(primary_key=True)
+    count: Mapped[int] = mapped_column(default=0)
+
+
+class ResolutionTimeCounter(BaseModel):
+    """Running totals of the resolution time of the finished service
+    requests per institution.
+
+    Maintained by the request service in the same transaction that changes
+    the status of a request, the average is `total_seconds / count`.
+    """
+
+    __tablename__ = "resolution_time_counters"
+
+    institution_id: Mapped[int] = mapped_column(
+        ForeignKey("institutions.id", ondelete="CASCADE"), primary_key=True
+    )
+    count: Mapped[int] = mapped_column(default=0)
+    total_seconds: Mapped[float] = mapped_column(default=0)
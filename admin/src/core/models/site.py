@@ -14,6 +14,7 @@ class SiteConfig(BaseModel):
     contact_info: Mapped[Str256]
     maintenance_active: Mapped[bool]
     maintenance_message: Mapped[Str512]
+    version: Mapped[int] = mapped_column(init=False, default=1)
 
     created_at: Mapped[Timestamp] = mapped_column(init=False)
     updated_at: Mapped[Timestamp] = mapped_column(
@@ -22,7 +23,7 @@ class SiteConfig(BaseModel):
 
     @override
     def _hidden_columns(self):
-        return ("created_at", "updated_at")
+        return ("created_at", "updated_at", "version")
 
 
 def defaultSiteConfig():
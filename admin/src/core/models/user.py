@@ -2,6 +2,7 @@
 
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 
@@ -43,6 +44,22 @@ class User(BaseModel):
         init=False, onupdate=func.current_timestamp()
     )
 
+    __table_args__ = (
+        # Substring filters (ILIKE '%...%') by email and username
+        Index(
+            "idx_users_email_trgm",
+            "email",
+            postgresql_using="gin",
+            postgresql_ops={"email": "gin_trgm_ops"},
+        ),
+        Index(
+            "idx_users_username_trgm",
+            "username",
+            postgresql_using="gin",
+            postgresql_ops={"username": "gin_trgm_ops"},
+        ),
+    )
+
 
 class PreRegisterUser(BaseModel):
     __tablename__ = "pre_register_users"
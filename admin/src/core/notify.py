@@ -0,0 +1,120 @@
+"""Cross process notifications through PostgreSQL LISTEN/NOTIFY.
+
+Every worker process runs a daemon thread with a dedicated connection that
+listens on the subscribed channels and dispatches the payloads to the
+registered handlers. Handlers run outside of the application context, so
+they should only invalidate in-process state.
+"""
+
+import os
+import select
+import threading
+import time
+import typing as t
+
+import flask
+import sqlalchemy as sa
+from sqlalchemy import exc
+
+from src.core.db import db
+
+Handler = t.Callable[[str], None]
+
+LISTEN_POLL_TIMEOUT = 5.0
+LISTEN_RECONNECT_DELAY = 5.0
+
+_handlers: t.Dict[str, t.List[Handler]] = {}
+_listener_pid: t.Union[int, None] = None
+_listener_lock = threading.Lock()
+
+
+def subscribe(channel: str, handler: Handler) -> None:
+    """Registers a handler for the notifications sent to `channel`.
+
+    Must be called before the listener is started, usually at import time.
+    """
+    _handlers.setdefault(channel, []).append(handler)
+
+
+def notify(channel: str, payload: str = "") -> None:
+    """Sends a notification to every listening process.
+
+    The notification is part of the current transaction, it is only
+    delivered if the transaction is committed.
+    """
+    db.session.execute(
+        sa.text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": payload},
+    )
+
+
+def _dispatch(channel: str, payload: str) -> None:
+    for handler in _handlers.get(channel, ()):
+        try:
+            handler(payload)
+        except Exception as e:
+            print(f"[error]: notification handler for '{channel}' \n{e}")
+
+
+def _listen(engine: sa.Engine) -> None:
+    while True:
+        try:
+            connection = engine.raw_connection()
+        except exc.SQLAlchemyError:
+            time.sleep(LISTEN_RECONNECT_DELAY)
+            continue
+
+        try:
+            dbapi_connection = connection.driver_connection
+            dbapi_connection.autocommit = True  # pyright: ignore
+            with dbapi_connection.cursor() as cursor:  # pyright: ignore
+                for channel in _handlers:
+                    cursor.execute(f'LISTEN "{channel}"')
+
+            while True:
+                readable, _, _ = select.select(
+                    (dbapi_connection,), (), (), LISTEN_POLL_TIMEOUT
+                )
+                if not readable:
+                    continue
+
+                dbapi_connection.poll()  # pyright: ignore
+                notifies = dbapi_connection.notifies  # pyright: ignore
+                while notifies:
+                    notification = notifies.pop(0)
+                    _dispatch(notification.channel, notification.payload)
+        except Exception as e:
+            print(f"[error]: notification listener disconnected \n{e}")
+            time.sleep(LISTEN_RECONNECT_DELAY)
+        finally:
+            connection.invalidate()
+
+
+def ensure_listener() -> None:
+    """Starts the listener thread of the current process if needed.
+
+    The check is done per process id, so it is safe to call it on every
+    request of a forked worker. Requires an application context.
+    """
+    global _listener_pid
+
+    pid = os.getpid()
+    if _listener_pid == pid or not _handlers:
+        return
+
+    with _listener_lock:
+        if _listener_pid == pid:
+            return
+
+        thread = threading.Thread(
+            target=_listen,
+            args=(db.engine,),
+            name="notify-listener",
+            daemon=True,
+        )
+        thread.start()
+        _listener_pid = pid
+
+
+def init_app(app: flask.Flask) -> None:
+    app.before_request(ensure_listener)
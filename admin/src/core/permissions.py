@@ -1,4 +1,6 @@
 import enum
+import functools
+import typing as t
 
 
 class RoleEnum(enum.Enum):
@@ -142,3 +144,50 @@ ROLE_MODULE_PERMISSIONS = {
         ),
     },
 }
+
+
+def permission_name(module: ModuleEnum, action: ActionEnum) -> str:
+    return f"{module.value}_{action.value}"
+
+
+PERMISSION_BITS: t.Dict[str, int] = {
+    permission_name(module, action): 1 << bit
+    for bit, (module, action) in enumerate(
+        (module, action)
+        for module, actions in MODULE_ACTIONS.items()
+        for action in actions
+    )
+}
+"""Bit assigned to each permission name, compiled from `MODULE_ACTIONS`."""
+
+UNKNOWN_PERMISSION_BIT = 1 << len(PERMISSION_BITS)
+"""Bit used for permission names that don't exist, no role is granted it."""
+
+
+def permissions_mask(names: t.Iterable[str]) -> int:
+    """Compiles permission names into a bitmask."""
+    mask = 0
+    for name in names:
+        mask |= PERMISSION_BITS.get(name, UNKNOWN_PERMISSION_BIT)
+    return mask
+
+
+@functools.lru_cache(maxsize=256)
+def required_mask(names: t.Tuple[str, ...]) -> int:
+    """Cached version of `permissions_mask` for required permissions."""
+    return permissions_mask(names)
+
+
+def has_permissions(granted: int, required: int) -> bool:
+    return granted & required == required
+
+
+ROLE_PERMISSION_MASKS: t.Dict[RoleEnum, int] = {
+    role: permissions_mask(
+        permission_name(module, action)
+        for module, actions in modules.items()
+        for action in actions
+    )
+    for role, modules in ROLE_MODULE_PERMISSIONS.items()
+}
+"""Bitmask of each role, compiled from `ROLE_MODULE_PERMISSIONS`."""
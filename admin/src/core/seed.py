@@ -5,8 +5,12 @@ def seed_db() -> None:
     application to work properly. This function should be called after the
     database has been created or reseted.
     """
-    from src.core.db import db
+    from src.core.db import db, transaction
     from src.core.models import auth, site
+    from src.services.auth import AuthService
 
     site.seed_site_config(db)
     auth.seed_auth(db)
+    with transaction():
+        # The running processes may have cached the previous roles
+        AuthService.invalidate_role_masks()
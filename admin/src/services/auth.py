@@ -1,22 +1,38 @@
 import secrets
+import time
 import typing as t
 from datetime import datetime, timedelta
 
 import sqlalchemy as sa
+from flask import Flask
 from sqlalchemy import exc as sa_exc
 from typing_extensions import Unpack
 
-from src.core import permissions
+from src.core import notify, permissions
 from src.core.db import db
 from src.core.enums import RegisterTypes
-from src.core.models.auth import Role, UserInstitutionRole
+from src.core.models.auth import (
+    Permission,
+    Role,
+    RolePermission,
+    UserInstitutionRole,
+)
 from src.core.models.user import PreRegisterUser
 from src.services.base import BaseService, BaseServiceError
+from src.services.membership import MembershipService
 
 # flake8: noqa E501
 
 InstitutionsRoles = t.Literal["OWNER", "MANAGER", "OPERATOR"]
 
+ROLE_MASKS_CHANNEL = "role_masks"
+"""Notification channel used to drop the cached role masks of every
+process when the role permissions change."""
+
+ROLE_MASKS_CACHE_TTL = 300.0
+"""Seconds before the cached role masks are reloaded even without a
+notification, in case a broadcast is missed."""
+
 
 class PreRegisterUserParams(t.TypedDict):
     firstname: str
@@ -37,6 +53,30 @@ class AuthService(BaseService):
 
     AuthServiceError = AuthServiceError
 
+    _role_masks: t.Union[t.Dict[int, int], None] = None
+    _role_masks_at: float = 0.0
+
+    @classmethod
+    def init_app(cls, app: Flask) -> None:
+        """Checks the role permissions of the database when the app is
+        created, see `check_role_permissions`.
+
+        The differences are logged as warnings. A database that can't be
+        queried yet is only logged too, so the commands that create it can
+        still run.
+        """
+        with app.app_context():
+            try:
+                problems = cls.check_role_permissions()
+            except sa_exc.SQLAlchemyError as e:
+                app.logger.warning(
+                    "Could not check the role permissions: %s", e.code
+                )
+                return
+
+        for problem in problems:
+            app.logger.warning(problem)
+
     @classmethod
     def get_pre_user_by_email(
         cls, email: str
@@ -69,7 +109,7 @@ class AuthService(BaseService):
             **kwargs, token=token, register_type=register_type
         )
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
 
         return user
 
@@ -86,7 +126,6 @@ class AuthService(BaseService):
             .where(PreRegisterUser.token == token)
             .delete()
         )
-        db.session.commit()
         return delete_count == 1
 
     @classmethod
@@ -117,28 +156,102 @@ class AuthService(BaseService):
         return difference > one_day
 
     @classmethod
-    def get_user_permissions(
-        cls, user_id: int, institution_id: int
-    ) -> t.Sequence[str]:
-        stmt = sa.text(
-            """
-            SELECT
-                permissions.name
-            FROM
-                users
-                INNER JOIN users_institutions_roles ON users.id = users_institutions_roles.user_id
-                INNER JOIN roles ON users_institutions_roles.role_id = roles.id
-                INNER JOIN roles_permissions ON roles.id = roles_permissions.role_id
-                INNER JOIN permissions ON roles_permissions.permission_id = permissions.id
-            WHERE
-                users.id = :user_id AND users_institutions_roles.institution_id = :institution_id
-            """
-        )
-        result = db.session.scalars(
-            stmt, {"user_id": user_id, "institution_id": institution_id}
+    def _query_role_masks(
+        cls,
+    ) -> t.Tuple[t.Dict[int, int], t.Dict[int, str]]:
+        rows = db.session.execute(
+            sa.select(Role.id, Role.name, Permission.name)
+            .outerjoin(RolePermission, RolePermission.role_id == Role.id)
+            .outerjoin(
+                Permission, Permission.id == RolePermission.permission_id
+            )
         ).all()
 
-        return result
+        masks: t.Dict[int, int] = {}
+        role_names: t.Dict[int, str] = {}
+        for role_id, role_name, permission_name in rows:
+            role_names[role_id] = role_name
+            masks[role_id] = masks.get(role_id, 0)
+            if permission_name is not None:
+                masks[role_id] |= permissions.permissions_mask(
+                    (permission_name,)
+                )
+
+        return masks, role_names
+
+    @classmethod
+    def load_role_masks(cls) -> t.Dict[int, int]:
+        """Loads the permissions bitmask of every role from the database.
+
+        The database is the source of truth for the permissions.
+
+        Returns:
+            The permissions bitmask by role id.
+        """
+        masks, _ = cls._query_role_masks()
+
+        return masks
+
+    @classmethod
+    def check_role_permissions(cls) -> t.List[str]:
+        """Compares the roles of the database with the static
+        `ROLE_MODULE_PERMISSIONS`.
+
+        Returns:
+            The description of every difference found, empty if they are
+            consistent.
+        """
+        masks, role_names = cls._query_role_masks()
+        role_ids = {name: id for id, name in role_names.items()}
+
+        problems: t.List[str] = []
+        for role in permissions.RoleEnum:
+            role_id = role_ids.get(role.value)
+            if role_id is None:
+                problems.append(f"Role '{role.value}' missing in database")
+            elif masks[role_id] != permissions.ROLE_PERMISSION_MASKS[role]:
+                problems.append(
+                    f"Role '{role.value}' permissions in database differ "
+                    "from ROLE_MODULE_PERMISSIONS"
+                )
+
+        return problems
+
+    @classmethod
+    def get_role_masks(cls) -> t.Dict[int, int]:
+        """Gets the cached permissions bitmask by role id.
+
+        The masks are reloaded when a process broadcasts a change with
+        `invalidate_role_masks` or after `ROLE_MASKS_CACHE_TTL` seconds.
+        """
+        masks = cls._role_masks
+        if (
+            masks is not None
+            and time.monotonic() - cls._role_masks_at < ROLE_MASKS_CACHE_TTL
+        ):
+            return masks
+
+        masks = cls.load_role_masks()
+        # An empty result means the database is not seeded yet
+        if masks:
+            cls._role_masks = masks
+            cls._role_masks_at = time.monotonic()
+
+        return masks
+
+    @classmethod
+    def _on_role_masks_notification(cls, payload: str) -> None:
+        cls._role_masks = None
+
+    @classmethod
+    def invalidate_role_masks(cls) -> None:
+        """Drops the cached role masks in every process.
+
+        Must be called inside the transaction that changes the role
+        permissions, the other processes are notified when it commits.
+        """
+        cls._role_masks = None
+        notify.notify(ROLE_MASKS_CHANNEL)
 
     @classmethod
     def add_institution_role(
@@ -159,15 +272,17 @@ class AuthService(BaseService):
             """
         )
         try:
-            db.session.execute(
-                stmt,
-                {
-                    "user_id": user_id,
-                    "institution_id": institution_id,
-                    "role": _role,
-                },
-            )
-            db.session.commit()
+            # A failed insert only rolls back the savepoint
+            with db.session.begin_nested():
+                db.session.execute(
+                    stmt,
+                    {
+                        "user_id": user_id,
+                        "institution_id": institution_id,
+                        "role": _role,
+                    },
+                )
+            MembershipService.invalidate_user(user_id)
         except sa_exc.SQLAlchemyError:
             return False
 
@@ -185,19 +300,20 @@ class AuthService(BaseService):
         """
         role_name = permissions.RoleEnum[role].value
         try:
-            delete_count = (
-                db.session.query(UserInstitutionRole)
-                .filter(
-                    UserInstitutionRole.user_id == user_id,
-                    UserInstitutionRole.institution_id == institution_id,
-                    UserInstitutionRole.role_id
-                    == db.session.query(Role.id)
-                    .filter(Role.name == role_name)
-                    .scalar_subquery(),
+            with db.session.begin_nested():
+                delete_count = (
+                    db.session.query(UserInstitutionRole)
+                    .filter(
+                        UserInstitutionRole.user_id == user_id,
+                        UserInstitutionRole.institution_id == institution_id,
+                        UserInstitutionRole.role_id
+                        == db.session.query(Role.id)
+                        .filter(Role.name == role_name)
+                        .scalar_subquery(),
+                    )
+                    .delete()
                 )
-                .delete()
-            )
-            db.session.commit()
+            MembershipService.invalidate_user(user_id)
         except sa_exc.SQLAlchemyError:
             return False
 
@@ -210,22 +326,5 @@ class AuthService(BaseService):
 
         return result is not None
 
-    @classmethod
-    def get_site_admin_permissions(cls, user_id: int) -> t.Sequence[str]:
-        stmt = sa.text(
-            """
-            SELECT
-                permissions.name
-            FROM
-                users
-                INNER JOIN site_admins ON users.id = site_admins.user_id
-                INNER JOIN roles ON site_admins.role_id = roles.id
-                INNER JOIN roles_permissions ON roles.id = roles_permissions.role_id
-                INNER JOIN permissions ON roles_permissions.permission_id = permissions.id
-            WHERE
-                users.id = :user_id
-            """
-        )
-        result = db.session.scalars(stmt, {"user_id": user_id}).all()
 
-        return result
+notify.subscribe(ROLE_MASKS_CHANNEL, AuthService._on_role_masks_notification)
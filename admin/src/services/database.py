@@ -1,7 +1,31 @@
+import typing as t
+
+import sqlalchemy as sa
 from sqlalchemy import exc, text
+from sqlalchemy.schema import AddConstraint, CreateIndex, DropIndex
 
 from src.core.db import db
 from src.services.base import BaseService
+from src.services.purge import PurgeService
+from src.services.service import ServiceService
+from src.services.site import SiteService
+
+OBSOLETE_INDEXES = (
+    "idx_service_requests_institution_service_created",
+    "idx_service_requests_user_status_created",
+)
+"""Indexes replaced by others with a different column order."""
+
+SCHEMA_MIGRATIONS = (
+    "ALTER TABLE services "
+    "ADD COLUMN IF NOT EXISTS request_count integer NOT NULL DEFAULT 0, "
+    "ADD COLUMN IF NOT EXISTS last_requested_at timestamp with time zone",
+    "ALTER TABLE service_requests "
+    "ALTER COLUMN closed_at DROP DEFAULT, "
+    "ALTER COLUMN closed_at TYPE timestamp with time zone",
+)
+"""Columns added or changed on tables that an existing database already
+has, `create_all` doesn't alter them."""
 
 
 class DatabaseService(BaseService):
@@ -13,3 +37,90 @@ class DatabaseService(BaseService):
             return True
         except exc.SQLAlchemyError:
             return False
+
+    @staticmethod
+    def _index_changed(index: sa.Index, reflected: t.Any) -> bool:
+        """Whether an existing index differs from its declaration in its
+        columns, uniqueness, method or partial predicate."""
+        options = index.dialect_options["postgresql"]
+        reflected_options = reflected.get("dialect_options", {})
+        return (
+            [column.name for column in index.columns]
+            != reflected["column_names"]
+            or bool(index.unique) != bool(reflected["unique"])
+            or (options["using"] or "btree")
+            != reflected_options.get("postgresql_using", "btree")
+            or (options["where"] is None)
+            != ("postgresql_where" not in reflected_options)
+        )
+
+    @classmethod
+    def rebuild_indexes(cls) -> t.List[str]:
+        """Migrates an existing database to the tables, columns, foreign
+        keys and indexes declared by the models.
+
+        `create_all` skips the tables that already exist, so the columns in
+        `SCHEMA_MIGRATIONS`, the site config and purge jobs columns and the
+        search columns of the services are added here first. Then the
+        missing foreign keys and indexes are created, the indexes whose
+        definition changed are recreated and the indexes in
+        `OBSOLETE_INDEXES` are dropped. The change is not committed, it is
+        part of the caller transaction.
+
+        Returns:
+            The description of every created foreign key and index.
+
+        Raises:
+            SQLAlchemyError: If existing rows violate a new foreign key.
+        """
+        connection = db.session.connection()
+        # Also provisions the extensions and the text search configuration
+        db.metadata.create_all(bind=connection)
+        for statement in SCHEMA_MIGRATIONS:
+            db.session.execute(text(statement))
+        SiteService.rebuild_site_config()
+        PurgeService.rebuild_purge_jobs()
+
+        service_columns = {
+            column["name"]
+            for column in sa.inspect(connection).get_columns("services")
+        }
+        if not {"visible", "search_trgm"} <= service_columns:
+            # Also creates the search indexes, they need these columns
+            ServiceService.rebuild_search_vector()
+
+        inspector = sa.inspect(connection)
+        created: t.List[str] = []
+        for table in db.metadata.sorted_tables:
+            foreign_keys = {
+                tuple(foreign_key["constrained_columns"])
+                for foreign_key in inspector.get_foreign_keys(table.name)
+            }
+            for constraint in table.foreign_key_constraints:
+                columns = tuple(constraint.column_keys)
+                if columns not in foreign_keys:
+                    db.session.execute(AddConstraint(constraint))
+                    created.append(
+                        f"{table.name} ({', '.join(columns)}) foreign key"
+                    )
+
+            indexes = {
+                index["name"]: index
+                for index in inspector.get_indexes(table.name)
+            }
+            for index in table.indexes:
+                reflected = indexes.get(index.name)
+                if reflected is None:
+                    db.session.execute(CreateIndex(index))
+                    created.append(f"{table.name} {index.name} index")
+                elif cls._index_changed(index, reflected):
+                    db.session.execute(DropIndex(index))
+                    db.session.execute(CreateIndex(index))
+                    created.append(
+                        f"{table.name} {index.name} index, recreated"
+                    )
+
+        for name in OBSOLETE_INDEXES:
+            db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+        return created
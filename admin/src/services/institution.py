@@ -9,10 +9,20 @@ from src.core import enums, permissions
 from src.core.db import db
 from src.core.models.auth import Role, UserInstitutionRole
 from src.core.models.institution import Institution
+from src.core.models.purge import PurgeJob
 from src.core.models.service import Service
-from src.core.models.service_requests import RequestNote, ServiceRequest
+from src.core.models.service_requests import (
+    RequestNote,
+    ResolutionTimeCounter,
+    ServiceRequest,
+)
 from src.core.models.user import User
+from src.services import pagination
 from src.services.base import BaseService, BaseServiceError
+from src.services.membership import MembershipService
+from src.services.purge import PurgeService
+from src.services.request import RequestService
+from src.services.service import ServiceService
 
 
 class InstitutionParams(t.TypedDict):
@@ -59,28 +69,33 @@ class InstitutionService(BaseService):
 
     @classmethod
     def get_institutions(
-        cls, page: int = 1, per_page: int = 10
-    ) -> t.Tuple[t.List[Institution], int]:
+        cls, page: int = 1, per_page: int = 10, count: bool = True
+    ) -> t.Tuple[t.List[Institution], t.Union[int, None]]:
         query = db.session.query(Institution)
-        total = query.count()
-        institutions = (
-            query.offset((page - 1) * per_page).limit(per_page).all()
-        )
 
-        return institutions, total
+        return pagination.paginate(query, page, per_page, count)
 
     @classmethod
     def get_enabled_institutions(
-        cls, page: int = 1, per_page: int = 10
-    ) -> t.Tuple[t.List[Institution], int]:
+        cls, page: int = 1, per_page: int = 10, count: bool = True
+    ) -> t.Tuple[t.List[Institution], t.Union[int, None]]:
         query = db.session.query(Institution).filter(Institution.enabled)
 
-        total = query.count()
-        institutions = (
-            query.offset((page - 1) * per_page).limit(per_page).all()
-        )
+        return pagination.paginate(query, page, per_page, count)
 
-        return institutions, total
+    @classmethod
+    def get_institutions_by_ids(
+        cls, institution_ids: t.Sequence[int]
+    ) -> t.List[Institution]:
+        if len(institution_ids) == 0:
+            return []
+
+        return (
+            db.session.query(Institution)
+            .filter(Institution.id.in_(institution_ids))
+            .order_by(Institution.id)
+            .all()
+        )
 
     @classmethod
     def get_institution(
@@ -99,11 +114,11 @@ class InstitutionService(BaseService):
         """
         institution = Institution(**kwargs)
         try:
-            db.session.add(institution)
-            db.session.commit()
+            with db.session.begin_nested():
+                db.session.add(institution)
+            MembershipService.invalidate_all()
             return institution
         except sa_exc.SQLAlchemyError as e:
-            db.session.rollback()
             raise InstitutionServiceError(
                 f"Could not create institution: {e.code}"
             )
@@ -117,82 +132,117 @@ class InstitutionService(BaseService):
         Returns:
             Institution: The updated institution.
             None: If the institution could not be found.
+
+        Raises:
+            InstitutionServiceError: If the institution is pending deletion.
         """
         institution = db.session.query(Institution).get(institution_id)
         if institution:
+            if PurgeService.is_pending(
+                enums.PurgeTarget.INSTITUTION, institution_id
+            ):
+                raise InstitutionServiceError(
+                    "La institución está pendiente de eliminación"
+                )
             for key, value in kwargs.items():
                 setattr(institution, key, value)
-            db.session.commit()
+            if "enabled" in kwargs:
+                ServiceService.update_institution_visibility(
+                    institution_id, kwargs["enabled"]
+                )
+            MembershipService.invalidate_all()
+            db.session.flush()
             return institution
 
         return None
 
     @classmethod
-    def delete_institution(cls, institution_id: int) -> bool:
-        """Delete an institution by id.
+    def delete_institution(
+        cls, institution_id: int
+    ) -> t.Union[PurgeJob, None]:
+        """Marks an institution as pending deletion.
 
-        The deletion of an institution cascades to all the services, requests
-        and notes associated with the institution.
+        The institution and its services are disabled and its members removed
+        right away, the purge worker deletes its services, requests and notes
+        in batches and then the institution, see `purge_institution`.
 
         Returns:
-            bool: True if the institution was deleted, False if the institution
-                was not deleted or if the institution could not be found.
+            The purge job of the institution or None if the institution does
+            not exist.
         """
+        institution = db.session.get(Institution, institution_id)
+        if institution is None:
+            return None
+
+        institution.enabled = False
+        ServiceService.update_institution_visibility(institution_id, False)
         (
-            db.session.query(RequestNote)
-            .filter(
-                RequestNote.id.in_(
-                    sa.select(RequestNote.id)
-                    .join(
-                        ServiceRequest,
-                        sa.and_(
-                            ServiceRequest.id == RequestNote.service_request_id
-                        ),
-                    )
-                    .join(
-                        Service,
-                        sa.and_(
-                            Service.id == ServiceRequest.service_id,
-                            Service.institution_id == institution_id,
-                        ),
-                    )
-                )
-            )
+            db.session.query(UserInstitutionRole)
+            .filter(UserInstitutionRole.institution_id == institution_id)
             .delete()
         )
-        (
-            db.session.query(ServiceRequest)
-            .filter(
-                ServiceRequest.id.in_(
-                    sa.select(ServiceRequest.id).join(
-                        Service,
-                        sa.and_(
-                            Service.id == ServiceRequest.service_id,
-                            Service.institution_id == institution_id,
-                        ),
-                    )
-                )
-            )
-            .delete()
+        requests = sa.select(ServiceRequest.id).where(
+            ServiceRequest.institution_id == institution_id
         )
-        (
-            db.session.query(Service)
-            .filter(Service.institution_id == institution_id)
-            .delete()
+        total_rows = PurgeService.count_rows(
+            sa.select(RequestNote.id).where(
+                RequestNote.service_request_id.in_(requests)
+            ),
+            requests,
+            sa.select(Service.id).where(
+                Service.institution_id == institution_id
+            ),
+            sa.select(Institution.id).where(Institution.id == institution_id),
         )
-        (
-            db.session.query(UserInstitutionRole)
-            .filter(UserInstitutionRole.institution_id == institution_id)
-            .delete()
+        job = PurgeService.enqueue(
+            enums.PurgeTarget.INSTITUTION, institution_id, total_rows
+        )
+        MembershipService.invalidate_all()
+
+        return job
+
+    @classmethod
+    def purge_institution(
+        cls, institution_id: int, batch_size: int
+    ) -> t.Tuple[int, bool]:
+        """Deletes a batch of the notes, requests and services of an
+        institution pending deletion, or the institution once it has none
+        left.
+
+        The purge handler of institutions, runs in the purge job transaction.
+        """
+        deleted = PurgeService.delete_batch(
+            RequestNote,
+            batch_size,
+            RequestNote.service_request_id.in_(
+                sa.select(ServiceRequest.id).where(
+                    ServiceRequest.institution_id == institution_id
+                )
+            ),
         )
-        delete_count = (
+        if deleted == 0:
+            deleted = PurgeService.delete_batch(
+                ServiceRequest,
+                batch_size,
+                ServiceRequest.institution_id == institution_id,
+                before=RequestService.discount_request_ids,
+            )
+        if deleted == 0:
+            deleted = PurgeService.delete_batch(
+                Service, batch_size, Service.institution_id == institution_id
+            )
+        if deleted > 0:
+            return deleted, False
+
+        deleted = (
             db.session.query(Institution)
             .filter(Institution.id == institution_id)
             .delete()
         )
-        db.session.commit()
+        MembershipService.invalidate_all()
+        ServiceService.invalidate_search_cache()
 
-        return delete_count == 1
+        return deleted, True
 
     @classmethod
     def get_user_institutions(cls, user_id: int) -> t.List[Institution]:
@@ -246,8 +296,8 @@ class InstitutionService(BaseService):
 
     @classmethod
     def get_institution_users(
-        cls, institution_id: int, page: int, per_page: int
-    ):
+        cls, institution_id: int, page: int, per_page: int, count: bool = True
+    ) -> t.Tuple[t.List[t.Tuple[User, Role]], t.Union[int, None]]:
         query = (
             db.session.query(User, Role)
             .join(
@@ -267,10 +317,8 @@ class InstitutionService(BaseService):
             .filter(UserInstitutionRole.role_id == Role.id)
             .order_by(User.id)
         )
-        total: int = query.count()
-        users = query.offset((page - 1) * per_page).limit(per_page).all()
 
-        return users, total
+        return pagination.paginate(query, page, per_page, count)
 
     @classmethod
     def update_institution_role(
@@ -290,7 +338,8 @@ class InstitutionService(BaseService):
         user_institution_role.user_id = user_id
         user_institution_role.institution_id = institution_id
         user_institution_role.role_id = role_id
-        db.session.commit()
+        MembershipService.invalidate_user(user_id)
+        db.session.flush()
         return True
 
     @classmethod
@@ -323,7 +372,8 @@ class InstitutionService(BaseService):
             return False
 
         db.session.delete(user_institution)
-        db.session.commit()
+        MembershipService.invalidate_user(user_id)
+        db.session.flush()
         return True
 
     @classmethod
@@ -367,22 +417,33 @@ class InstitutionService(BaseService):
     def get_most_efficient_institutions(
         cls,
     ) -> t.List[t.Tuple[Institution, datetime.timedelta]]:
-        query = (
-            db.session.query(
-                Institution,
-                sa.func.avg(
-                    ServiceRequest.updated_at - ServiceRequest.created_at
-                ).label("avg_resolution_time"),
-            )
+        """Gets the 10 institutions with the lowest average resolution time
+        of their finished requests.
+
+        Reads the totals maintained by the request service, from when each
+        request was created until it was closed.
+        """
+        avg_seconds = (
+            ResolutionTimeCounter.total_seconds / ResolutionTimeCounter.count
+        )
+        rows = (
+            db.session.query(Institution, avg_seconds)
             .join(
-                ServiceRequest,
-                Institution.id == ServiceRequest.institution_id,
+                ResolutionTimeCounter,
+                Institution.id == ResolutionTimeCounter.institution_id,
             )
-            .filter(ServiceRequest.status == enums.RequestStatus.FINISHED)
-            .group_by(Institution.id)
-            .order_by("avg_resolution_time")
+            .filter(ResolutionTimeCounter.count > 0)
+            .order_by(avg_seconds, Institution.id)
             .limit(10)
+            .all()
         )
-        res = query.all()
 
-        return res  # pyright: ignore[reportReturnType]
+        return [
+            (institution, datetime.timedelta(seconds=seconds))
+            for institution, seconds in rows
+        ]
+
+
+PurgeService.register_handler(
+    enums.PurgeTarget.INSTITUTION, InstitutionService.purge_institution
+)
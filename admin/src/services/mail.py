@@ -1,13 +1,31 @@
+import hashlib
 import smtplib
+import typing as t
+from datetime import datetime, timedelta, timezone
 
 import jinja2
-from flask import Flask, render_template_string
+import sqlalchemy as sa
+from flask import Flask, current_app
 from flask_mail import Mail, Message
 
+from src.core.db import db
+from src.core.enums import MailStatus
+from src.core.models.mail import MailOutbox
 from src.services.base import BaseService, BaseServiceError
+from src.utils.cache import LRUCache
 
 EMAIL_RENDERING_ERROR = "El renderizado del template para el body fallo"
 EMAIL_SMTP_ERROR = "El envio del mail fallo"
+EMAIL_TEMPLATE_NOT_FOUND = "El template de mail '{}' no existe"
+
+TEMPLATE_CACHE_SIZE = 128
+
+REGISTER_CONFIRMATION_TEMPLATE = "register_confirmation"
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE = timedelta(seconds=30)
+OUTBOX_BACKOFF_MAX = timedelta(hours=1)
 
 
 class MailServiceError(BaseServiceError):
@@ -17,38 +35,99 @@ class MailServiceError(BaseServiceError):
 class MailService(BaseService):
     """Service for handling mail sending.
 
-    This service is used for sending emails as the configured sender.
+    This service is used for sending emails as the configured sender, either
+    directly or through the mail outbox processed by the mail worker.
     """
 
     _mail: Mail
+    _compiled: "LRUCache[str, jinja2.Template]" = LRUCache(TEMPLATE_CACHE_SIZE)
+    _named: t.Dict[str, jinja2.Template] = {}
     MailServiceError = MailServiceError
 
     @classmethod
     def init_app(cls, app: Flask) -> None:
         cls._mail = Mail()
         cls._mail.init_app(app)
+        cls.register_template(
+            app,
+            REGISTER_CONFIRMATION_TEMPLATE,
+            'Finalice el registro entrando a <a href="{{ register_link }}">'
+            "este link</a> completando la informacion restante.",
+        )
+
+    @classmethod
+    def register_template(cls, app: Flask, name: str, source: str) -> None:
+        """Compiles a mail template once and registers it by name.
+
+        Args:
+            app: The application whose jinja environment compiles it.
+            name: The name used to render the template with `send_mail`.
+            source: The jinja2 source of the template.
+        """
+        cls._named[name] = app.jinja_env.from_string(source)
+
+    @classmethod
+    def _compile(cls, source: str) -> jinja2.Template:
+        key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        return cls._compiled.get_or_set(
+            key, lambda: current_app.jinja_env.from_string(source)
+        )
+
+    @classmethod
+    def _render_body(
+        cls,
+        body: str,
+        template: t.Union[str, None] = None,
+        context: t.Union[t.Dict[str, t.Any], None] = None,
+    ) -> str:
+        context = dict(context or {})
+        try:
+            if template is not None:
+                compiled = cls._named.get(template)
+                if compiled is None:
+                    raise MailServiceError(
+                        EMAIL_TEMPLATE_NOT_FOUND.format(template)
+                    )
+            else:
+                compiled = cls._compile(body)
+            current_app.update_template_context(context)
+            return compiled.render(context)
+        except jinja2.TemplateError as e:
+            raise MailServiceError(e.message or EMAIL_RENDERING_ERROR)
 
     @classmethod
     def send_mail(
         cls,
         subject: str,
         recipients: str,
-        body: str,
+        body: str = "",
+        enqueue: bool = False,
+        template: t.Union[str, None] = None,
+        context: t.Union[t.Dict[str, t.Any], None] = None,
     ) -> None:
         """Sends an email.
 
+        The body is compiled once and the compiled template is cached, so
+        sending the same body to many recipients only renders it.
+
         Args:
             subject: The subject of the email.
             recipients: The recipients of the email.
             body: The body of the email, a jinja2 template string.
+            enqueue: If True the email is stored in the outbox and sent later
+                by the mail worker instead of during the request.
+            template: The name of a registered template used instead of
+                `body`.
+            context: The variables available when rendering the body.
 
         Raises:
             MailServiceError: If the email could not be sent.
         """
-        try:
-            html = render_template_string(body)
-        except jinja2.TemplateError as e:
-            raise MailServiceError(e.message or EMAIL_RENDERING_ERROR)
+        html = cls._render_body(body, template, context)
+        if enqueue:
+            cls.enqueue_mail(subject, recipients, html)
+            return
+
         msg = Message(
             subject=subject,
             recipients=[recipients],
@@ -58,3 +137,89 @@ class MailService(BaseService):
             cls._mail.send(msg)
         except smtplib.SMTPException as e:
             raise MailServiceError(e.strerror or EMAIL_SMTP_ERROR)
+
+    @classmethod
+    def enqueue_mail(cls, subject: str, recipients: str, html: str) -> int:
+        """Stores an already rendered email in the outbox.
+
+        The email is not committed, it is part of the caller transaction, so
+        it is only sent if the action that queued it is committed.
+
+        Returns:
+            The id of the outbox entry.
+        """
+        mail = MailOutbox(subject=subject, recipients=recipients, html=html)
+        db.session.add(mail)
+        db.session.flush()
+
+        return mail.id
+
+    @staticmethod
+    def _backoff(attempts: int) -> timedelta:
+        return min(
+            OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)), OUTBOX_BACKOFF_MAX
+        )
+
+    @classmethod
+    def _mark_failed_attempt(cls, mail: MailOutbox, error: str) -> None:
+        mail.attempts += 1
+        mail.last_error = error[:512]
+        if mail.attempts >= OUTBOX_MAX_ATTEMPTS:
+            mail.status = MailStatus.FAILED
+        else:
+            mail.next_attempt_at = datetime.now(timezone.utc) + cls._backoff(
+                mail.attempts
+            )
+
+    @classmethod
+    def process_outbox(cls, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+        """Sends a batch of pending emails from the outbox.
+
+        The rows are claimed with `FOR UPDATE SKIP LOCKED`, so several
+        workers can process the outbox concurrently. The whole batch is sent
+        over a single SMTP connection, failed emails are retried with an
+        exponential backoff until `OUTBOX_MAX_ATTEMPTS` is reached.
+
+        Returns:
+            The number of emails claimed.
+        """
+        mails: t.List[MailOutbox] = (
+            db.session.query(MailOutbox)
+            .filter(
+                MailOutbox.status == MailStatus.PENDING,
+                MailOutbox.next_attempt_at <= sa.func.now(),
+            )
+            .order_by(MailOutbox.next_attempt_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if len(mails) == 0:
+            db.session.rollback()
+            return 0
+
+        unsent = list(reversed(mails))
+        try:
+            with cls._mail.connect() as connection:
+                while unsent:
+                    mail = unsent[-1]
+                    msg = Message(
+                        subject=mail.subject,
+                        recipients=[mail.recipients],
+                        html=mail.html,
+                    )
+                    try:
+                        connection.send(msg)
+                        mail.status = MailStatus.SENT
+                        mail.sent_at = datetime.now(timezone.utc)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        cls._mark_failed_attempt(mail, str(e.recipients))
+                    unsent.pop()
+        except (smtplib.SMTPException, OSError) as e:
+            # The connection failed, the rest of the batch is retried later
+            for mail in unsent:
+                cls._mark_failed_attempt(mail, str(e) or EMAIL_SMTP_ERROR)
+
+        db.session.commit()
+
+        return len(mails)
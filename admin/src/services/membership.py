@@ -0,0 +1,173 @@
+import typing as t
+
+import sqlalchemy as sa
+
+from src.core import notify
+from src.core.db import db
+from src.core.models.auth import SiteAdmin, UserInstitutionRole
+from src.core.models.institution import Institution
+from src.core.models.user import User
+from src.services.base import BaseService
+from src.utils.cache import LRUCache
+
+MEMBERSHIP_CHANNEL = "membership"
+"""Notification channel used to invalidate memberships in every process,
+the payload is a user id or `*` for all the memberships."""
+
+MEMBERSHIP_CACHE_SIZE = 1024
+MEMBERSHIP_CACHE_TTL = 300.0
+
+
+class UserIdentity(t.NamedTuple):
+    id: int
+    username: str
+    email: str
+    is_active: bool
+
+
+class InstitutionRef(t.NamedTuple):
+    id: int
+    name: str
+
+
+class Membership(t.NamedTuple):
+    """Request independent snapshot of a user and its institutions.
+
+    Attributes:
+        user: The identity of the user.
+        site_admin_role_id: The site admin role of the user, if any.
+        institution_roles: The role id of the user by institution id.
+        institutions: The institutions of the user, for site admins all the
+            institutions.
+    """
+
+    user: UserIdentity
+    site_admin_role_id: t.Union[int, None]
+    institution_roles: t.Dict[int, int]
+    institutions: t.Tuple[InstitutionRef, ...]
+
+
+class MembershipService(BaseService):
+    """Service for the cached identity and memberships of users.
+
+    This service is used by the request hooks to resolve the current user
+    without querying the database on every request.
+    """
+
+    _memberships: "LRUCache[int, Membership]" = LRUCache(
+        MEMBERSHIP_CACHE_SIZE, MEMBERSHIP_CACHE_TTL
+    )
+    _all_institutions: "LRUCache[str, t.Tuple[InstitutionRef, ...]]" = (
+        LRUCache(1, MEMBERSHIP_CACHE_TTL)
+    )
+
+    @classmethod
+    def _load_all_institutions(cls) -> t.Tuple[InstitutionRef, ...]:
+        rows = db.session.execute(
+            sa.select(Institution.id, Institution.name).order_by(
+                Institution.id
+            )
+        ).all()
+        return tuple(InstitutionRef(id, name) for id, name in rows)
+
+    @classmethod
+    def _load_membership(cls, user_id: int) -> t.Union[Membership, None]:
+        user = db.session.execute(
+            sa.select(
+                User.id, User.username, User.email, User.is_active
+            ).where(User.id == user_id)
+        ).first()
+        if user is None:
+            return None
+
+        site_admin_role_id = db.session.execute(
+            sa.select(SiteAdmin.role_id).where(SiteAdmin.user_id == user_id)
+        ).scalar()
+
+        if site_admin_role_id is not None:
+            return Membership(
+                user=UserIdentity(*user),
+                site_admin_role_id=site_admin_role_id,
+                institution_roles={},
+                institutions=tuple(),
+            )
+
+        rows = db.session.execute(
+            sa.select(
+                Institution.id, Institution.name, UserInstitutionRole.role_id
+            )
+            .join(
+                UserInstitutionRole,
+                UserInstitutionRole.institution_id == Institution.id,
+            )
+            .where(UserInstitutionRole.user_id == user_id)
+            .order_by(Institution.id)
+        ).all()
+
+        return Membership(
+            user=UserIdentity(*user),
+            site_admin_role_id=None,
+            institution_roles={id: role_id for id, _, role_id in rows},
+            institutions=tuple(
+                InstitutionRef(id, name) for id, name, _ in rows
+            ),
+        )
+
+    @classmethod
+    def get_membership(cls, user_id: int) -> t.Union[Membership, None]:
+        """Gets the cached membership of a user.
+
+        Returns:
+            Membership: The membership of the user.
+            None: If the user does not exist.
+        """
+        membership = cls._memberships.get(user_id)
+        if membership is not None:
+            return membership
+
+        membership = cls._load_membership(user_id)
+        if membership is not None:
+            cls._memberships.set(user_id, membership)
+
+        return membership
+
+    @classmethod
+    def get_all_institutions(cls) -> t.Tuple[InstitutionRef, ...]:
+        """Gets the cached id and name of every institution."""
+        return cls._all_institutions.get_or_set(
+            "all", cls._load_all_institutions
+        )
+
+    @classmethod
+    def _on_invalidate_notification(cls, payload: str) -> None:
+        if payload.isdigit():
+            cls._memberships.pop(int(payload))
+        else:
+            cls._memberships.clear()
+            cls._all_institutions.clear()
+
+    @classmethod
+    def invalidate_user(cls, user_id: int) -> None:
+        """Invalidates the membership of a user in every process.
+
+        Must be called inside the transaction that changes the user, the
+        other processes are notified when it is committed.
+        """
+        cls._memberships.pop(user_id)
+        notify.notify(MEMBERSHIP_CHANNEL, str(user_id))
+
+    @classmethod
+    def invalidate_all(cls) -> None:
+        """Invalidates every membership in every process.
+
+        Used when institutions change, since their names are part of the
+        cached memberships.
+        """
+        cls._memberships.clear()
+        cls._all_institutions.clear()
+        notify.notify(MEMBERSHIP_CHANNEL, "*")
+
+
+notify.subscribe(
+    MEMBERSHIP_CHANNEL, MembershipService._on_invalidate_notification
+)
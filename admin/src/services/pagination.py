@@ -0,0 +1,157 @@
+import base64
+import binascii
+import json
+import typing as t
+from datetime import datetime
+
+import sqlalchemy as sa
+import sqlalchemy.orm as sao
+
+from src.services.base import BaseServiceError
+
+TRow = t.TypeVar("TRow")
+
+KeysetOrder = t.Literal["asc", "desc"]
+
+
+class PaginationError(BaseServiceError):
+    pass
+
+
+class Cursor(t.NamedTuple):
+    """Position of the last row of a keyset page.
+
+    Rows are ordered by `(created_at, id)`, so the pair identifies a unique
+    position in the result even if several rows share the same timestamp.
+    """
+
+    created_at: datetime
+    id: int
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Encodes a cursor into an opaque url safe string."""
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Decodes a cursor previously created by `encode_cursor`.
+
+    Raises:
+        PaginationError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        created_at, id = json.loads(raw)
+        return Cursor(datetime.fromisoformat(created_at), int(id))
+    except (
+        binascii.Error,
+        UnicodeError,
+        TypeError,
+        ValueError,
+    ):
+        raise PaginationError("Cursor de paginacion invalido")
+
+
+def paginate(
+    query: "sao.Query[t.Any]",
+    page: int,
+    per_page: int,
+    count: bool = True,
+) -> t.Tuple[t.List[t.Any], t.Union[int, None]]:
+    """Fetches a page of `query` and the total of rows in one statement.
+
+    The total is computed with a `count(*) OVER ()` window function added to
+    the page query, so the filters are evaluated only once. When the query
+    selects several entities or columns each row is returned as a tuple
+    without the total column.
+
+    Args:
+        query: The filtered and ordered query.
+        page: The page number, starting at 1.
+        per_page: The number of rows per page.
+        count: Whether to compute the total, if False the total is None.
+
+    Returns:
+        The rows of the page and the total of rows matching the query.
+    """
+    offset = (page - 1) * per_page
+    if not count:
+        return query.offset(offset).limit(per_page).all(), None
+
+    total_column = sa.func.count().over().label("pagination_total")
+    rows = query.add_columns(total_column).offset(offset).limit(per_page).all()
+    if len(rows) == 0:
+        # The window is empty when the page is out of range, only then a
+        # separate count is needed to know the total
+        return [], query.order_by(None).count() if page > 1 else 0
+
+    total: int = rows[0][-1]
+    if len(rows[0]) == 2:
+        return [row[0] for row in rows], total
+
+    return [tuple(row[:-1]) for row in rows], total
+
+
+def keyset_page(
+    query: "sao.Query[TRow]",
+    created_at: "sao.InstrumentedAttribute[datetime]",
+    id: "sao.InstrumentedAttribute[int]",
+    cursor: t.Union[str, None],
+    per_page: int,
+    order: KeysetOrder = "desc",
+    key: t.Union[t.Callable[[TRow], Cursor], None] = None,
+) -> t.Tuple[t.List[TRow], t.Union[str, None]]:
+    """Fetches a page of `query` using keyset (cursor) pagination.
+
+    Instead of skipping `(page - 1) * per_page` rows, the query continues
+    right after the `(created_at, id)` position stored in the cursor, so
+    every page costs the same as the first one.
+
+    Args:
+        query: The filtered query, it must not be ordered.
+        created_at: The timestamp column used as the primary sort key.
+        id: The primary key column used to break ties.
+        cursor: The cursor returned by the previous page or None for the
+            first page.
+        per_page: The number of rows per page.
+        order: The direction of the ordering.
+        key: Extracts the cursor position from a row, required when the
+            query returns tuples instead of a single entity.
+
+    Returns:
+        The rows of the page and the cursor for the next page, the cursor is
+        None if there are no more rows.
+
+    Raises:
+        PaginationError: If the cursor is malformed.
+    """
+    if cursor:
+        position = decode_cursor(cursor)
+        row_position = sa.tuple_(created_at, id)
+        bound = sa.tuple_(
+            sa.literal(position.created_at, created_at.type),
+            sa.literal(position.id, id.type),
+        )
+        query = query.filter(
+            row_position < bound if order == "desc" else row_position > bound
+        )
+
+    if order == "desc":
+        query = query.order_by(created_at.desc(), id.desc())
+    else:
+        query = query.order_by(created_at.asc(), id.asc())
+
+    rows = query.limit(per_page + 1).all()
+    if len(rows) <= per_page:
+        return rows, None
+
+    rows = rows[:per_page]
+    last = rows[-1]
+    if key is None:
+        position = Cursor(getattr(last, created_at.key), getattr(last, id.key))
+    else:
+        position = key(last)
+
+    return rows, encode_cursor(position.created_at, position.id)
@@ -0,0 +1,229 @@
+import typing as t
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+
+from src.core.db import db
+from src.core.enums import PurgeStatus, PurgeTarget
+from src.core.models.purge import PurgeJob
+from src.services.base import BaseService
+
+PURGE_BATCH_SIZE = 1000
+PURGE_MAX_ATTEMPTS = 5
+PURGE_BACKOFF_BASE = timedelta(seconds=30)
+PURGE_BACKOFF_MAX = timedelta(hours=1)
+
+PurgeHandler = t.Callable[[int, int], t.Tuple[int, bool]]
+"""Deletes up to `batch_size` rows of a target pending deletion.
+
+Called with the target id and the batch size, returns the number of rows
+deleted and whether the target itself was deleted.
+"""
+
+
+class PurgeService(BaseService):
+    """Service for the deletion of entities in the background.
+
+    Deleting an institution, service or user marks it as pending deletion
+    with a purge job. The purge worker deletes its dependents in bounded
+    batches, each in its own transaction, and the entity last.
+    """
+
+    _handlers: t.Dict[PurgeTarget, PurgeHandler] = {}
+
+    @classmethod
+    def register_handler(
+        cls, target: PurgeTarget, handler: PurgeHandler
+    ) -> None:
+        cls._handlers[target] = handler
+
+    @classmethod
+    def enqueue(
+        cls, target: PurgeTarget, target_id: int, total_rows: int
+    ) -> PurgeJob:
+        """Creates the purge job of a target, unless it has one pending.
+
+        The change is not committed, it is part of the caller transaction.
+
+        Returns:
+            The pending purge job of the target.
+        """
+        job = cls.get_pending_job(target, target_id)
+        if job is None:
+            job = PurgeJob(
+                target=target, target_id=target_id, total_rows=total_rows
+            )
+            db.session.add(job)
+            db.session.flush()
+
+        return job
+
+    @classmethod
+    def get_job(cls, job_id: int) -> t.Union[PurgeJob, None]:
+        return db.session.get(PurgeJob, job_id)
+
+    @classmethod
+    def get_pending_job(
+        cls, target: PurgeTarget, target_id: int
+    ) -> t.Union[PurgeJob, None]:
+        return (
+            db.session.query(PurgeJob)
+            .filter(
+                PurgeJob.target == target,
+                PurgeJob.target_id == target_id,
+                PurgeJob.status == PurgeStatus.PENDING,
+            )
+            .first()
+        )
+
+    @classmethod
+    def is_pending(cls, target: PurgeTarget, target_id: int) -> bool:
+        """Whether the target is pending deletion, its changes must be
+        rejected while the purge worker deletes it."""
+        return db.session.query(
+            sa.exists().where(
+                PurgeJob.target == target,
+                PurgeJob.target_id == target_id,
+                PurgeJob.status == PurgeStatus.PENDING,
+            )
+        ).scalar()
+
+    @classmethod
+    def get_unfinished_jobs(cls) -> t.List[PurgeJob]:
+        """Returns the pending and the failed purge jobs."""
+        return (
+            db.session.query(PurgeJob)
+            .filter(PurgeJob.status != PurgeStatus.DONE)
+            .order_by(PurgeJob.id)
+            .all()
+        )
+
+    @classmethod
+    def count_rows(cls, *queries: sa.Select[t.Any]) -> int:
+        """Counts the rows selected by `queries`, used as the estimated
+        total of a purge job."""
+        total = 0
+        for query in queries:
+            count = db.session.scalar(
+                sa.select(sa.func.count()).select_from(query.subquery())
+            )
+            total += count or 0
+
+        return total
+
+    @classmethod
+    def delete_batch(
+        cls,
+        model: t.Any,
+        batch_size: int,
+        *criteria: sa.ColumnElement[bool],
+        before: t.Optional[t.Callable[[t.Sequence[int]], None]] = None,
+    ) -> int:
+        """Deletes up to `batch_size` rows of `model` matching `criteria`.
+
+        Args:
+            before: Called with the ids of the rows before deleting them.
+
+        Returns:
+            The number of rows deleted.
+        """
+        ids = db.session.scalars(
+            sa.select(model.id).where(*criteria).limit(batch_size)
+        ).all()
+        if len(ids) == 0:
+            return 0
+
+        if before is not None:
+            before(ids)
+        db.session.execute(
+            sa.delete(model).where(model.id.in_(ids)),
+            execution_options={"synchronize_session": False},
+        )
+
+        return len(ids)
+
+    @classmethod
+    def rebuild_purge_jobs(cls) -> None:
+        """Adds the retry columns and the `FAILED` status to the purge jobs
+        of an existing database, and recreates the index of the pending
+        jobs in order of their next attempt."""
+        statements = (
+            "ALTER TYPE purgestatus ADD VALUE IF NOT EXISTS 'FAILED'",
+            "ALTER TABLE purge_jobs ADD COLUMN IF NOT EXISTS attempts "
+            "integer NOT NULL DEFAULT 0",
+            "ALTER TABLE purge_jobs ADD COLUMN IF NOT EXISTS next_attempt_at "
+            "timestamp with time zone NOT NULL DEFAULT now()",
+            "DROP INDEX IF EXISTS idx_purge_jobs_pending",
+        )
+        for statement in statements:
+            db.session.execute(sa.text(statement))
+        index = next(
+            index
+            for index in PurgeJob.__table__.indexes
+            if index.name == "idx_purge_jobs_pending"
+        )
+        db.session.execute(sa.schema.CreateIndex(index))
+
+    @staticmethod
+    def _backoff(attempts: int) -> timedelta:
+        return min(
+            PURGE_BACKOFF_BASE * (2 ** (attempts - 1)), PURGE_BACKOFF_MAX
+        )
+
+    @classmethod
+    def _mark_failed_attempt(cls, job: PurgeJob, error: str) -> None:
+        job.attempts += 1
+        job.last_error = error[:512]
+        if job.attempts >= PURGE_MAX_ATTEMPTS:
+            job.status = PurgeStatus.FAILED
+            job.finished_at = datetime.now(timezone.utc)
+        else:
+            job.next_attempt_at = datetime.now(timezone.utc) + cls._backoff(
+                job.attempts
+            )
+
+    @classmethod
+    def process_job(cls, batch_size: int = PURGE_BATCH_SIZE) -> int:
+        """Deletes a batch of rows of the next pending purge job.
+
+        The job is claimed with `FOR UPDATE SKIP LOCKED`, so several workers
+        can purge different targets concurrently. The batch is committed
+        with the progress of the job. A failed batch is rolled back to a
+        savepoint, keeping the job locked, and retried with an exponential
+        backoff until `PURGE_MAX_ATTEMPTS` is reached, then the job fails
+        and the target can be deleted again to retry it.
+
+        Returns:
+            The number of rows deleted.
+        """
+        job = (
+            db.session.query(PurgeJob)
+            .filter(
+                PurgeJob.status == PurgeStatus.PENDING,
+                PurgeJob.next_attempt_at <= sa.func.now(),
+            )
+            .order_by(PurgeJob.next_attempt_at, PurgeJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.session.rollback()
+            return 0
+
+        handler = cls._handlers[job.target]
+        try:
+            with db.session.begin_nested():
+                deleted, done = handler(job.target_id, batch_size)
+        except Exception as e:
+            cls._mark_failed_attempt(job, str(e) or type(e).__name__)
+            db.session.commit()
+            return 0
+
+        job.deleted_rows += deleted
+        if done:
+            job.status = PurgeStatus.DONE
+            job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+        return deleted
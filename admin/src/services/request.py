@@ -1,23 +1,50 @@
 import typing as t
 from datetime import datetime
+from enum import Enum
 
 import sqlalchemy as sa
+import sqlalchemy.orm as sao
 import typing_extensions as te
+from sqlalchemy.dialects import postgresql as pg
 
 from src.core.db import db
 from src.core.enums import RequestStatus, ServiceTypes
 from src.core.models.auth import Role, UserInstitutionRole
-from src.core.models.institution import Institution
 from src.core.models.service import Service
 from src.core.models.service_requests import (
     RequestHistory,
     RequestNote,
+    RequestStatusCounter,
+    ResolutionTimeCounter,
     ServiceRequest,
 )
 from src.core.models.user import User
 from src.core.permissions import RoleEnum
+from src.services import pagination
 from src.services.base import BaseService, BaseServiceError
 
+EXPORT_CHUNK_SIZE = 500
+"""Rows fetched per round trip from the server side cursor of an export."""
+
+EXPORT_COLUMNS = (
+    "id",
+    "title",
+    "description",
+    "status",
+    "user_email",
+    "service_id",
+    "created_at",
+    "closed_at",
+)
+
+TERMINAL_STATUSES = frozenset(
+    (RequestStatus.FINISHED, RequestStatus.REJECTED, RequestStatus.CANCELED)
+)
+"""Statuses that close a request, they stamp its `closed_at`."""
+
+BULK_STATUS_MAX_REQUESTS = 200
+"""Requests that can change their status in a single bulk transition."""
+
 
 class RequestParams(t.TypedDict):
     title: str
@@ -42,6 +69,60 @@ class RequestHistoryParams(t.TypedDict):
     observations: str
 
 
+class StatusTransition(Enum):
+    UPDATED = "Actualizada"
+    UNCHANGED = "Ya tenía el estado"
+    NOT_FOUND = "No encontrada"
+
+
+class RequestHistoryEntry(t.NamedTuple):
+    status: RequestStatus
+    observations: str
+    created_at: datetime
+
+
+class TimelineEvent(t.NamedTuple):
+    """A note or a status change in the timeline of a service request.
+
+    Attributes:
+        kind: "note" or "history".
+        id: The id of the note or of the history entry.
+        created_at: When the event happened.
+        text: The text of the note or the observations of the change.
+        status: The new status of a status change, None for notes.
+        user_id: The author of a note, None for status changes.
+        username: The username of the author of a note.
+    """
+
+    kind: t.Literal["note", "history"]
+    id: int
+    created_at: datetime
+    text: str
+    status: t.Union[RequestStatus, None]
+    user_id: t.Union[int, None]
+    username: t.Union[str, None]
+
+
+class RequestBundle(t.NamedTuple):
+    """Everything shown on the detail of a service request.
+
+    Attributes:
+        request: The service request.
+        service: The requested service.
+        user: The user that made the request.
+        notes: The first page of notes with their authors, newest first.
+        notes_total: The total of notes of the request.
+        history: The status changes of the request, oldest first.
+    """
+
+    request: ServiceRequest
+    service: Service
+    user: User
+    notes: t.List[t.Tuple[RequestNote, User]]
+    notes_total: int
+    history: t.List[RequestHistoryEntry]
+
+
 class RequestServiceError(BaseServiceError):
     pass
 
@@ -54,6 +135,205 @@ class RequestService(BaseService):
 
     RequestServiceError = RequestServiceError
 
+    @classmethod
+    def _update_status_counter(
+        cls,
+        institution_id: int,
+        service_id: int,
+        status: RequestStatus,
+        delta: int,
+    ) -> None:
+        """Adds `delta` to the rollup of requests with `status`.
+
+        The change is not committed, it is part of the caller transaction.
+        """
+        stmt = pg.insert(RequestStatusCounter).values(
+            institution_id=institution_id,
+            service_id=service_id,
+            status=status,
+            count=delta,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=(
+                RequestStatusCounter.institution_id,
+                RequestStatusCounter.service_id,
+                RequestStatusCounter.status,
+            ),
+            set_={"count": RequestStatusCounter.count + delta},
+        )
+        db.session.execute(stmt)
+
+    @classmethod
+    def _update_service_requests(cls, service_id: int, delta: int) -> None:
+        """Adds `delta` to the denormalized request count of a service.
+
+        The change is not committed, it is part of the caller transaction.
+        """
+        values: t.Dict[str, t.Any] = {
+            "request_count": Service.request_count + delta,
+            # Keeps the update from touching the service timestamp
+            "updated_at": Service.updated_at,
+        }
+        if delta > 0:
+            values["last_requested_at"] = sa.func.now()
+        db.session.execute(
+            sa.update(Service).where(Service.id == service_id).values(values)
+        )
+
+    @classmethod
+    def _update_resolution_counter(
+        cls, delta: int, *criteria: sa.ColumnElement[bool]
+    ) -> None:
+        """Adds the finished requests matching `criteria` to the resolution
+        time totals of their institutions, `delta` -1 removes them.
+
+        The change is not committed, it is part of the caller transaction.
+        """
+        db.session.flush()
+        resolution_seconds = sa.extract(
+            "epoch", ServiceRequest.closed_at - ServiceRequest.created_at
+        )
+        totals = (
+            sa.select(
+                ServiceRequest.institution_id,
+                sa.func.count() * delta,
+                sa.func.sum(resolution_seconds) * delta,
+            )
+            .where(
+                ServiceRequest.status == RequestStatus.FINISHED,
+                ServiceRequest.closed_at.is_not(None),
+                *criteria,
+            )
+            .group_by(ServiceRequest.institution_id)
+        )
+        cls._upsert_resolution_counter(
+            pg.insert(ResolutionTimeCounter).from_select(
+                ("institution_id", "count", "total_seconds"), totals
+            )
+        )
+
+    @classmethod
+    def _upsert_resolution_counter(cls, stmt: pg.Insert) -> None:
+        """Adds the counts and seconds inserted by `stmt` to the existing
+        resolution time totals."""
+        stmt = stmt.on_conflict_do_update(
+            index_elements=(ResolutionTimeCounter.institution_id,),
+            set_={
+                "count": ResolutionTimeCounter.count + stmt.excluded["count"],
+                "total_seconds": ResolutionTimeCounter.total_seconds
+                + stmt.excluded["total_seconds"],
+            },
+        )
+        db.session.execute(stmt)
+
+    @classmethod
+    def discount_requests(cls, *criteria: sa.ColumnElement[bool]) -> None:
+        """Removes the requests matching `criteria` from the status rollup,
+        the request count of their services and the resolution time totals.
+
+        Must be called before deleting the requests, in the same transaction.
+        """
+        cls._update_resolution_counter(-1, *criteria)
+        counts = (
+            db.session.query(
+                ServiceRequest.institution_id,
+                ServiceRequest.service_id,
+                ServiceRequest.status,
+                sa.func.count(),
+            )
+            .filter(*criteria)
+            .group_by(
+                ServiceRequest.institution_id,
+                ServiceRequest.service_id,
+                ServiceRequest.status,
+            )
+            .all()
+        )
+        by_service: t.Dict[int, int] = {}
+        for institution_id, service_id, status, count in counts:
+            cls._update_status_counter(
+                institution_id, service_id, status, -count
+            )
+            by_service[service_id] = by_service.get(service_id, 0) + count
+
+        for service_id, count in by_service.items():
+            cls._update_service_requests(service_id, -count)
+
+    @classmethod
+    def discount_request_ids(cls, request_ids: t.Sequence[int]) -> None:
+        cls.discount_requests(ServiceRequest.id.in_(request_ids))
+
+    @classmethod
+    def rebuild_status_counters(cls) -> int:
+        """Rebuilds the status rollup from the service requests.
+
+        Returns:
+            The number of rollup rows created.
+        """
+        db.session.query(RequestStatusCounter).delete()
+        result = db.session.execute(
+            sa.insert(RequestStatusCounter).from_select(
+                ("institution_id", "service_id", "status", "count"),
+                sa.select(
+                    ServiceRequest.institution_id,
+                    ServiceRequest.service_id,
+                    ServiceRequest.status,
+                    sa.func.count(),
+                ).group_by(
+                    ServiceRequest.institution_id,
+                    ServiceRequest.service_id,
+                    ServiceRequest.status,
+                ),
+            )
+        )
+
+        return result.rowcount  # pyright: ignore[reportAttributeAccessIssue]
+
+    @classmethod
+    def rebuild_service_request_counts(cls) -> None:
+        """Recomputes the request count and the last request date of every
+        service from the service requests."""
+        db.session.execute(
+            sa.update(Service).values(
+                request_count=sa.select(sa.func.count())
+                .where(ServiceRequest.service_id == Service.id)
+                .scalar_subquery(),
+                last_requested_at=sa.select(
+                    sa.func.max(ServiceRequest.created_at)
+                )
+                .where(ServiceRequest.service_id == Service.id)
+                .scalar_subquery(),
+                updated_at=Service.updated_at,
+            )
+        )
+
+    @classmethod
+    def rebuild_resolution_times(cls) -> None:
+        """Recomputes `closed_at` from the request history and the
+        resolution time totals from the finished requests."""
+        # The last history entry with the current status is when the
+        # request was closed, requests closed on creation have no history
+        closed_at = sa.func.coalesce(
+            sa.select(sa.func.max(RequestHistory.created_at))
+            .where(
+                RequestHistory.service_request_id == ServiceRequest.id,
+                RequestHistory.status == ServiceRequest.status,
+            )
+            .scalar_subquery(),
+            ServiceRequest.created_at,
+        )
+        db.session.execute(
+            sa.update(ServiceRequest).values(
+                closed_at=sa.case(
+                    (ServiceRequest.status.in_(TERMINAL_STATUSES), closed_at),
+                    else_=None,
+                ),
+                updated_at=ServiceRequest.updated_at,
+            )
+        )
+        db.session.query(ResolutionTimeCounter).delete()
+        cls._update_resolution_counter(1)
+
     @classmethod
     def get_request(cls, request_id: int) -> t.Union[ServiceRequest, None]:
         request = db.session.get(ServiceRequest, request_id)
@@ -67,59 +347,84 @@ class RequestService(BaseService):
         service_id: int,
         page: int = 1,
         per_page: int = 10,
-    ) -> t.Tuple[t.List[ServiceRequest], int]:
-        requests = (
+        count: bool = True,
+    ) -> t.Tuple[t.List[ServiceRequest], t.Union[int, None]]:
+        query = (
             db.session.query(ServiceRequest)
             .filter(ServiceRequest.institution_id == institution_id)
             .filter(ServiceRequest.service_id == service_id)
-            .offset((page - 1) * per_page)
-            .limit(per_page)
-            .all()
-        )
-        total: int = (
-            db.session.query(ServiceRequest)
-            .filter(ServiceRequest.institution_id == institution_id)
-            .count()
         )
 
-        return requests, total
+        return pagination.paginate(query, page, per_page, count)
 
     @classmethod
-    def get_requests_by_user(
+    def _requests_by_user_query(
         cls,
         user_id: int,
-        page: int = 1,
-        per_page: int = 10,
         status: t.Union[RequestStatus, None] = None,
-        order: t.Union[t.Literal["asc", "desc"], None] = None,
-    ) -> t.Tuple[t.List[ServiceRequest], int]:
+    ) -> "sao.Query[ServiceRequest]":
         query = db.session.query(ServiceRequest).filter(
             ServiceRequest.user_id == user_id
         )
         if status is not None:
             query = query.filter(ServiceRequest.status == status)
 
+        return query
+
+    @classmethod
+    def get_requests_by_user(
+        cls,
+        user_id: int,
+        page: int = 1,
+        per_page: int = 10,
+        status: t.Union[RequestStatus, None] = None,
+        order: t.Union[t.Literal["asc", "desc"], None] = None,
+        count: bool = True,
+    ) -> t.Tuple[t.List[ServiceRequest], t.Union[int, None]]:
+        query = cls._requests_by_user_query(user_id, status)
+
         if order == "asc":
             query = query.order_by(ServiceRequest.created_at.asc())
         elif order == "desc":
             query = query.order_by(ServiceRequest.created_at.desc())
 
-        total = query.count()
-        requests = query.offset((page - 1) * per_page).limit(per_page).all()
+        return pagination.paginate(query, page, per_page, count)
+
+    @classmethod
+    def get_requests_by_user_keyset(
+        cls,
+        user_id: int,
+        cursor: t.Union[str, None] = None,
+        per_page: int = 10,
+        status: t.Union[RequestStatus, None] = None,
+        order: t.Union[t.Literal["asc", "desc"], None] = None,
+    ) -> t.Tuple[t.List[ServiceRequest], t.Union[str, None]]:
+        """Keyset paginated version of `get_requests_by_user`.
+
+        Returns:
+            The requests of the page and the cursor of the next page.
 
-        return requests, total
+        Raises:
+            PaginationError: If the cursor is malformed.
+        """
+        query = cls._requests_by_user_query(user_id, status)
+
+        return pagination.keyset_page(
+            query,
+            ServiceRequest.created_at,
+            ServiceRequest.id,
+            cursor,
+            per_page,
+            order or "desc",
+        )
 
     @classmethod
     def get_requests(
-        cls, page: int = 1, per_page: int = 10
-    ) -> t.Tuple[t.List[ServiceRequest], int]:
-        return (
-            db.session.query(ServiceRequest)
-            .offset((page - 1) * per_page)
-            .limit(per_page)
-            .all(),
-            db.session.query(ServiceRequest).count(),
-        )
+        cls, page: int = 1, per_page: int = 10, count: bool = True
+    ) -> t.Tuple[t.List[ServiceRequest], t.Union[int, None]]:
+        query = db.session.query(ServiceRequest)
+
+        return pagination.paginate(query, page, per_page, count)
 
     @classmethod
     def update_state_request(
@@ -146,16 +451,164 @@ class RequestService(BaseService):
             new_status is not None  # type:ignore
             and new_status != request.status.name  # type:ignore
         ):
+            if isinstance(new_status, str):
+                new_status = RequestStatus[new_status]
+            if request.status == RequestStatus.FINISHED:
+                cls._update_resolution_counter(
+                    -1, ServiceRequest.id == request_id
+                )
+            cls._update_status_counter(
+                request.institution_id,
+                request.service_id,
+                request.status,
+                -1,
+            )
+            cls._update_status_counter(
+                request.institution_id, request.service_id, new_status, 1
+            )
             request.status = new_status
+            # Stamped by the database, like `created_at` it is an aware time
+            request.closed_at = (  # pyright: ignore
+                sa.func.now() if new_status in TERMINAL_STATUSES else None
+            )
             cls.create_request_history(
                 request_id, new_status, kwargs["observations"]
             )
             db.session.add(request)
-            db.session.commit()
+            # Loads the `closed_at` stamped by the database
+            db.session.flush()
+            if new_status == RequestStatus.FINISHED:
+                cls._update_resolution_counter(
+                    1, ServiceRequest.id == request_id
+                )
             return True
 
         return False
 
+    @classmethod
+    def update_state_requests(
+        cls,
+        institution_id: int,
+        service_id: int,
+        request_ids: t.Sequence[int],
+        **kwargs: te.Unpack[RequestHistoryParams],
+    ) -> t.Dict[int, StatusTransition]:
+        """Updates the state of several requests of a service at once.
+
+        The requests are locked and updated by a single `UPDATE ...
+        RETURNING`, which also returns their previous status to adjust the
+        counters, and their history entries are created with a single
+        multi-row insert. Requests of other services or institutions are
+        not found.
+
+        Returns:
+            The result of the transition of each request id.
+        """
+        new_status = kwargs["status"]
+        if isinstance(new_status, str):
+            new_status = RequestStatus[new_status]
+
+        ids = sorted(set(request_ids))
+        results = {id: StatusTransition.NOT_FOUND for id in ids}
+        if len(ids) == 0:
+            return results
+
+        previous = (
+            sa.select(
+                ServiceRequest.id,
+                ServiceRequest.status,
+                ServiceRequest.closed_at,
+                ServiceRequest.created_at,
+            )
+            .where(
+                ServiceRequest.id
+                == sa.any_(sa.literal(ids, pg.ARRAY(sa.Integer))),
+                ServiceRequest.institution_id == institution_id,
+                ServiceRequest.service_id == service_id,
+                ServiceRequest.status != new_status,
+            )
+            .with_for_update()
+            .cte("previous")
+        )
+        rows = db.session.execute(
+            sa.update(ServiceRequest)
+            .where(ServiceRequest.id == previous.c.id)
+            .values(
+                status=new_status,
+                closed_at=(
+                    sa.func.now() if new_status in TERMINAL_STATUSES else None
+                ),
+            )
+            .returning(
+                ServiceRequest.id,
+                previous.c.status,
+                sa.extract(
+                    "epoch", previous.c.closed_at - previous.c.created_at
+                ),
+            ),
+            execution_options={"synchronize_session": False},
+        ).all()
+
+        updated_ids: t.List[int] = []
+        previous_counts: t.Dict[RequestStatus, int] = {}
+        finished_count, finished_seconds = 0, 0.0
+        for request_id, status, seconds in rows:
+            results[request_id] = StatusTransition.UPDATED
+            updated_ids.append(request_id)
+            previous_counts[status] = previous_counts.get(status, 0) + 1
+            if status == RequestStatus.FINISHED and seconds is not None:
+                finished_count += 1
+                finished_seconds += float(seconds)
+
+        if len(rows) > 0:
+            for status, count in previous_counts.items():
+                cls._update_status_counter(
+                    institution_id, service_id, status, -count
+                )
+            cls._update_status_counter(
+                institution_id, service_id, new_status, len(rows)
+            )
+            if finished_count > 0:
+                cls._upsert_resolution_counter(
+                    pg.insert(ResolutionTimeCounter).values(
+                        institution_id=institution_id,
+                        count=-finished_count,
+                        total_seconds=-finished_seconds,
+                    )
+                )
+            db.session.execute(
+                sa.insert(RequestHistory).values(
+                    [
+                        {
+                            "service_request_id": request_id,
+                            "status": new_status,
+                            "observations": kwargs["observations"],
+                        }
+                        for request_id in updated_ids
+                    ]
+                )
+            )
+            if new_status == RequestStatus.FINISHED:
+                cls._update_resolution_counter(
+                    1, ServiceRequest.id.in_(updated_ids)
+                )
+
+        not_updated = [
+            id for id in ids if results[id] == StatusTransition.NOT_FOUND
+        ]
+        if len(not_updated) > 0:
+            unchanged = db.session.scalars(
+                sa.select(ServiceRequest.id).where(
+                    ServiceRequest.id.in_(not_updated),
+                    ServiceRequest.institution_id == institution_id,
+                    ServiceRequest.service_id == service_id,
+                )
+            )
+            for request_id in unchanged:
+                results[request_id] = StatusTransition.UNCHANGED
+
+        return results
+
     @classmethod
     def create_request_history(
         cls, request_id: int, state: RequestStatus, observations: str
@@ -165,12 +618,8 @@ class RequestService(BaseService):
         Raises:
             RequestServiceError: If the request is not found.
         """
-        request = (
-            db.session.query(ServiceRequest)
-            .filter(ServiceRequest.id == request_id)
-            .first()
-        )
-
+        # Taken from the identity map when the caller already loaded it
+        request = db.session.get(ServiceRequest, request_id)
         if request is None:
             raise RequestServiceError("Solicitud no encontrada")
 
@@ -180,7 +629,7 @@ class RequestService(BaseService):
             observations=observations,
         )
         db.session.add(request)
-        db.session.commit()
+        db.session.flush()
 
         return request
 
@@ -209,32 +658,84 @@ class RequestService(BaseService):
             **kwargs,
         )
         db.session.add(request)
-        db.session.commit()
+        status = request.status
+        if isinstance(status, str):
+            status = RequestStatus[status]
+        if status in TERMINAL_STATUSES:
+            request.closed_at = sa.func.now()  # pyright: ignore
+        cls._update_status_counter(
+            service.institution_id, service_id, status, 1
+        )
+        cls._update_service_requests(service_id, 1)
+        # The id is assigned on flush
+        db.session.flush()
+        if status == RequestStatus.FINISHED:
+            cls._update_resolution_counter(1, ServiceRequest.id == request.id)
 
         return request
 
     @classmethod
-    def get_service_request_details(cls, service_request_id: int):
-        query = (
-            db.session.query(ServiceRequest, User, Service)
-            .join(User, User.id == ServiceRequest.user_id)
+    def get_request_bundle(
+        cls, request_id: int, notes_per_page: int = 10
+    ) -> t.Union[RequestBundle, None]:
+        """Gets a request with its service, requester, first page of notes
+        and status history.
+
+        Takes two queries: the request joined with its service and user,
+        with the history aggregated as JSON, and the page of notes.
+
+        Returns:
+            The bundle or None if the request does not exist.
+        """
+        history = (
+            sa.select(
+                sa.func.coalesce(
+                    sa.func.json_agg(
+                        pg.aggregate_order_by(
+                            sa.func.json_build_array(
+                                RequestHistory.status,
+                                RequestHistory.observations,
+                                RequestHistory.created_at,
+                            ),
+                            RequestHistory.created_at,
+                        )
+                    ),
+                    sa.text("'[]'::json"),
+                )
+            )
+            .where(RequestHistory.service_request_id == ServiceRequest.id)
+            .scalar_subquery()
+        )
+        row = (
+            db.session.query(ServiceRequest, Service, User, history)
             .join(Service, Service.id == ServiceRequest.service_id)
-            .filter(ServiceRequest.id == service_request_id)
+            .join(User, User.id == ServiceRequest.user_id)
+            .filter(ServiceRequest.id == request_id)
             .first()
         )
+        if row is None:
+            return None
 
-        return query
-
-    @classmethod
-    def get_request_notes(cls, request_id: int):
-        query = (
-            db.session.query(User.username, RequestNote.note)
-            .join(User, User.id == RequestNote.user_id)
-            .filter(RequestNote.service_request_id == request_id)
-            .all()
+        request, service, user, raw_history = row
+        notes, notes_total = cls.get_requests_notes_with_users(
+            request_id, page=1, per_page=notes_per_page
         )
 
-        return query
+        return RequestBundle(
+            request=request,
+            service=service,
+            user=user,
+            notes=notes,
+            notes_total=notes_total or 0,
+            history=[
+                RequestHistoryEntry(
+                    RequestStatus[status],
+                    observations,
+                    datetime.fromisoformat(created_at),
+                )
+                for status, observations, created_at in raw_history
+            ],
+        )
 
     @classmethod
     def get_requests_notes_with_users(
@@ -242,7 +743,8 @@ class RequestService(BaseService):
         request_id: int,
         page: int = 1,
         per_page: int = 10,
-    ) -> t.Tuple[t.List[t.Tuple[RequestNote, User]], int]:
+        count: bool = True,
+    ) -> t.Tuple[t.List[t.Tuple[RequestNote, User]], t.Union[int, None]]:
         query = (
             db.session.query(RequestNote, User)
             .join(User, RequestNote.user_id == User.id)
@@ -250,10 +752,37 @@ class RequestService(BaseService):
             .order_by(RequestNote.created_at.desc())
         )
 
-        total = query.count()
-        requests = query.offset((page - 1) * per_page).limit(per_page).all()
+        return pagination.paginate(query, page, per_page, count)
+
+    @classmethod
+    def get_requests_notes_with_users_keyset(
+        cls,
+        request_id: int,
+        cursor: t.Union[str, None] = None,
+        per_page: int = 10,
+    ) -> t.Tuple[t.List[t.Tuple[RequestNote, User]], t.Union[str, None]]:
+        """Keyset paginated version of `get_requests_notes_with_users`.
 
-        return requests, total  # pyright: ignore[reportReturnType]
+        Returns:
+            The notes of the page and the cursor of the next page.
+
+        Raises:
+            PaginationError: If the cursor is malformed.
+        """
+        query = (
+            db.session.query(RequestNote, User)
+            .join(User, RequestNote.user_id == User.id)
+            .filter(RequestNote.service_request_id == request_id)
+        )
+
+        return pagination.keyset_page(  # pyright: ignore[reportReturnType]
+            query,
+            RequestNote.created_at,
+            RequestNote.id,
+            cursor,
+            per_page,
+            key=lambda row: pagination.Cursor(row[0].created_at, row[0].id),
+        )
 
     @classmethod
     def create_note(
@@ -278,7 +807,7 @@ class RequestService(BaseService):
             service_request_id=service_request_id, user_id=user_id, note=note
         )
         db.session.add(request)
-        db.session.commit()
+        db.session.flush()
 
         return request
 
@@ -291,17 +820,21 @@ class RequestService(BaseService):
         )
 
     @classmethod
-    def get_requests_filter_by_service(
+    def _requests_filter_query(
         cls,
-        page: int,
-        per_page: int,
-        institution_id: int,
-        service_id: int,
+        institution_id: t.Union[int, None] = None,
+        service_id: t.Union[int, None] = None,
         **kwargs: te.Unpack[FilterRequestParams],
-    ) -> t.Tuple[t.List[ServiceRequest], int]:
+    ) -> "sao.Query[ServiceRequest]":
         query = db.session.query(ServiceRequest)
-        query = query.filter(ServiceRequest.institution_id == institution_id)
-        query = query.filter(ServiceRequest.service_id == service_id)
+        if institution_id is not None:
+            query = query.filter(
+                ServiceRequest.institution_id == institution_id
+            )
+
+        if service_id is not None:
+            query = query.filter(ServiceRequest.service_id == service_id)
+
         if "user_email" in kwargs:
             query = query.join(User, User.id == ServiceRequest.user_id)
             email = kwargs["user_email"]
@@ -310,6 +843,14 @@ class RequestService(BaseService):
         if "status" in kwargs:
             query = query.filter(ServiceRequest.status == kwargs["status"])
 
+        if "service_type" in kwargs:
+            query = query.join(
+                Service, Service.id == ServiceRequest.service_id
+            )
+            query = query.filter(
+                Service.service_type == kwargs["service_type"]
+            )
+
         if "start_date" in kwargs and kwargs["start_date"]:
             start_date = datetime.strptime(kwargs["start_date"], "%Y-%m-%d")
             query = query.filter(ServiceRequest.created_at >= start_date)
@@ -318,89 +859,270 @@ class RequestService(BaseService):
             end_date = datetime.strptime(kwargs["end_date"], "%Y-%m-%d")
             query = query.filter(ServiceRequest.created_at <= end_date)
 
-        total = query.count()
-        requests = query.offset((page - 1) * per_page).limit(per_page).all()
-
-        return requests, total
+        return query
 
     @classmethod
-    def get_requests_filter_by(
+    def get_requests_filter_by_service(
         cls,
         page: int,
         per_page: int,
+        institution_id: int,
+        service_id: int,
+        count: bool = True,
         **kwargs: te.Unpack[FilterRequestParams],
-    ) -> t.Tuple[t.List[ServiceRequest], int]:
-        query = db.session.query(ServiceRequest)
-        if "user_email" in kwargs:
-            query = query.join(User, User.id == ServiceRequest.user_id)
-            email = kwargs["user_email"]
-            query = query.filter(User.email.ilike(f"%{email}%"))
+    ) -> t.Tuple[t.List[ServiceRequest], t.Union[int, None]]:
+        query = cls._requests_filter_query(
+            institution_id=institution_id, service_id=service_id, **kwargs
+        )
 
-        if "status" in kwargs:
-            query = query.filter(ServiceRequest.status == kwargs["status"])
+        return pagination.paginate(query, page, per_page, count)
 
-        if "service_type" in kwargs:
-            query = query.join(
-                Service, Service.id == ServiceRequest.service_id
+    @classmethod
+    def get_requests_filter_by_service_keyset(
+        cls,
+        cursor: t.Union[str, None],
+        per_page: int,
+        institution_id: int,
+        service_id: int,
+        **kwargs: te.Unpack[FilterRequestParams],
+    ) -> t.Tuple[t.List[ServiceRequest], t.Union[str, None]]:
+        """Keyset paginated version of `get_requests_filter_by_service`.
+
+        The requests are ordered from the newest to the oldest.
+
+        Returns:
+            The requests of the page and the cursor of the next page.
+
+        Raises:
+            PaginationError: If the cursor is malformed.
+        """
+        query = cls._requests_filter_query(
+            institution_id=institution_id, service_id=service_id, **kwargs
+        )
+
+        return pagination.keyset_page(
+            query,
+            ServiceRequest.created_at,
+            ServiceRequest.id,
+            cursor,
+            per_page,
+        )
+
+    @classmethod
+    def iter_requests_export(
+        cls,
+        institution_id: t.Union[int, None] = None,
+        service_id: t.Union[int, None] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        **kwargs: te.Unpack[FilterRequestParams],
+    ) -> t.Iterator[t.Tuple[t.Any, ...]]:
+        """Streams the requests matching the filters for an export.
+
+        The rows are read through a server side cursor `chunk_size` at a
+        time, so the memory used doesn't depend on the number of rows. The
+        values follow the order of `EXPORT_COLUMNS`.
+        """
+        user_email = (
+            sa.select(User.email)
+            .where(User.id == ServiceRequest.user_id)
+            .correlate(ServiceRequest)
+            .scalar_subquery()
+        )
+        query = (
+            cls._requests_filter_query(
+                institution_id=institution_id, service_id=service_id, **kwargs
             )
-            query = query.filter(
-                Service.service_type == kwargs["service_type"]
+            .with_entities(
+                ServiceRequest.id,
+                ServiceRequest.title,
+                ServiceRequest.description,
+                ServiceRequest.status,
+                user_email,
+                ServiceRequest.service_id,
+                ServiceRequest.created_at,
+                ServiceRequest.closed_at,
             )
+            .order_by(ServiceRequest.created_at, ServiceRequest.id)
+            .yield_per(chunk_size)
+        )
+        for row in query:
+            yield tuple(row)
 
-        if "start_date" in kwargs and kwargs["start_date"]:
-            start_date = datetime.strptime(kwargs["start_date"], "%Y-%m-%d")
-            query = query.filter(ServiceRequest.created_at >= start_date)
+    @classmethod
+    def get_requests_filter_by(
+        cls,
+        page: int,
+        per_page: int,
+        count: bool = True,
+        **kwargs: te.Unpack[FilterRequestParams],
+    ) -> t.Tuple[t.List[ServiceRequest], t.Union[int, None]]:
+        query = cls._requests_filter_query(**kwargs)
+
+        return pagination.paginate(query, page, per_page, count)
+
+    @staticmethod
+    def _timeline_branch(
+        query: sa.Select[t.Any],
+        created_at: sa.ColumnElement[datetime],
+        event_id: sa.ColumnElement[int],
+        position: t.Union[pagination.Cursor, None],
+        order: pagination.KeysetOrder,
+        limit: int,
+    ) -> sa.Select[t.Any]:
+        if position is not None:
+            bound_created_at = sa.literal(position.created_at, created_at.type)
+            row_position = sa.tuple_(created_at, event_id)
+            bound = sa.tuple_(bound_created_at, sa.literal(position.id))
+            # The plain comparison lets the index bound the range scan
+            if order == "desc":
+                query = query.where(
+                    created_at <= bound_created_at, row_position < bound
+                )
+            else:
+                query = query.where(
+                    created_at >= bound_created_at, row_position > bound
+                )
 
-        if "end_date" in kwargs and kwargs["end_date"]:
-            end_date = datetime.strptime(kwargs["end_date"], "%Y-%m-%d")
-            query = query.filter(ServiceRequest.created_at <= end_date)
+        direction = sa.desc if order == "desc" else sa.asc
+        return query.order_by(
+            direction(created_at), direction(event_id)
+        ).limit(limit)
 
-        total = query.count()
-        requests = query.offset((page - 1) * per_page).limit(per_page).all()
+    @classmethod
+    def get_request_timeline(
+        cls,
+        request_id: int,
+        cursor: t.Union[str, None] = None,
+        per_page: int = 10,
+        order: pagination.KeysetOrder = "desc",
+    ) -> t.Tuple[t.List[TimelineEvent], t.Union[str, None]]:
+        """Gets a page of the notes and status changes of a request, merged
+        by creation date, using keyset pagination.
 
-        return requests, total
+        Each table is read from its `(service_request_id, created_at)` index
+        right after the cursor and limited to the page size before the
+        `UNION ALL`, so every page costs the same however long the timeline
+        is. Notes and history entries are told apart in the cursor by an
+        event id, twice the row id plus one for history entries.
 
-    @classmethod
-    def get_request_history(cls, request_id: int) -> t.List[RequestHistory]:
-        return (
-            db.session.query(RequestHistory)
-            .filter(RequestHistory.service_request_id == request_id)
-            .all()
+        Returns:
+            The events of the page and the cursor of the next page.
+
+        Raises:
+            PaginationError: If the cursor is malformed.
+        """
+        position = pagination.decode_cursor(cursor) if cursor else None
+        limit = per_page + 1
+
+        note_event_id = RequestNote.id * 2
+        notes = cls._timeline_branch(
+            sa.select(
+                sa.literal_column("'note'").label("kind"),
+                RequestNote.id.label("id"),
+                note_event_id.label("event_id"),
+                RequestNote.created_at.label("created_at"),
+                RequestNote.note.label("text"),
+                sa.cast(sa.null(), RequestHistory.status.type).label("status"),
+                User.id.label("user_id"),
+                User.username.label("username"),
+            )
+            .join_from(RequestNote, User, User.id == RequestNote.user_id)
+            .where(RequestNote.service_request_id == request_id),
+            RequestNote.created_at,
+            note_event_id,
+            position,
+            order,
+            limit,
+        )
+        history_event_id = RequestHistory.id * 2 + 1
+        history = cls._timeline_branch(
+            sa.select(
+                sa.literal_column("'history'"),
+                RequestHistory.id,
+                history_event_id,
+                RequestHistory.created_at,
+                RequestHistory.observations,
+                RequestHistory.status,
+                sa.cast(sa.null(), sa.Integer),
+                sa.cast(sa.null(), sa.String),
+            ).where(RequestHistory.service_request_id == request_id),
+            RequestHistory.created_at,
+            history_event_id,
+            position,
+            order,
+            limit,
         )
 
+        timeline = sa.union_all(notes, history).subquery("timeline")
+        direction = sa.desc if order == "desc" else sa.asc
+        rows = db.session.execute(
+            sa.select(timeline)
+            .order_by(
+                direction(timeline.c.created_at),
+                direction(timeline.c.event_id),
+            )
+            .limit(limit)
+        ).all()
+
+        events = [
+            TimelineEvent(
+                kind=row.kind,
+                id=row.id,
+                created_at=row.created_at,
+                text=row.text,
+                status=row.status,
+                user_id=row.user_id,
+                username=row.username,
+            )
+            for row in rows[:per_page]
+        ]
+        if len(rows) <= per_page:
+            return events, None
+
+        last = rows[per_page - 1]
+        return events, pagination.encode_cursor(last.created_at, last.event_id)
+
     @classmethod
     def get_requests_count_per_status(
         cls,
         institution_owner_id: t.Union[int, None] = None,
         institution_id: t.Union[int, None] = None,
     ) -> t.List[t.Tuple[RequestStatus, int]]:
-        query = db.session.query(ServiceRequest.status, sa.func.count("*"))
+        """Gets the amount of requests per status.
+
+        The counts are read from the status rollup, so the cost depends on
+        the number of services instead of the number of requests.
+        """
+        query = db.session.query(
+            RequestStatusCounter.status,
+            sa.func.sum(RequestStatusCounter.count),
+        )
 
         if institution_owner_id is not None:
-            query = (
-                query.join(Service, Service.id == ServiceRequest.service_id)
-                .join(Institution, Institution.id == Service.institution_id)
-                .join(
-                    UserInstitutionRole,
-                    sa.and_(
-                        UserInstitutionRole.institution_id == Institution.id,
+            query = query.filter(
+                RequestStatusCounter.institution_id.in_(
+                    sa.select(UserInstitutionRole.institution_id).where(
+                        UserInstitutionRole.user_id == institution_owner_id,
                         UserInstitutionRole.role_id
                         == (
                             sa.select(Role.id)
                             .where(Role.name == RoleEnum.OWNER.value)
                             .scalar_subquery()
                         ),
-                        UserInstitutionRole.user_id == institution_owner_id,
-                    ),
+                    )
                 )
             )
 
         if institution_id is not None:
             query = query.filter(
-                ServiceRequest.institution_id == institution_id
+                RequestStatusCounter.institution_id == institution_id
             )
 
-        query = query.group_by(ServiceRequest.status)
+        # Rows of the rollup are kept at zero when their requests change of
+        # status, the statuses without requests are left out
+        query = query.group_by(RequestStatusCounter.status).having(
+            sa.func.sum(RequestStatusCounter.count) > 0
+        )
 
         res = query.all()
 
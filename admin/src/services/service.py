@@ -1,15 +1,86 @@
+import threading
 import typing as t
 
 import sqlalchemy as sa
 import sqlalchemy.exc as sa_exc
+import sqlalchemy.orm as sao
 import typing_extensions as te
+from sqlalchemy.dialects import postgresql as pg
 
+from src.core import notify
 from src.core.db import db
-from src.core.enums import ServiceTypes
+from src.core.enums import PurgeTarget, ServiceTypes
 from src.core.models.institution import Institution
-from src.core.models.service import Service
+from src.core.models.purge import PurgeJob
+from src.core.models.service import (
+    SEARCH_TRGM_EXPRESSION,
+    SEARCH_TSV_EXPRESSION,
+    Service,
+)
 from src.core.models.service_requests import RequestNote, ServiceRequest
+from src.services import pagination
 from src.services.base import BaseService, BaseServiceError
+from src.services.purge import PurgeService
+from src.services.request import RequestService
+from src.utils.cache import LRUCache
+from src.utils.terms import TermDictionary, normalize_term
+from src.utils.tsquery import compile_tsquery, search_text
+
+SEARCH_CHANNEL = "service_search"
+"""Notification channel used to invalidate the search cache and the
+suggestion terms of every process, the payload is the id of the changed
+service or empty if every service may have changed."""
+
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 60.0
+
+SEARCH_RANK_NORMALIZATION = 32
+"""`ts_rank` normalization flag, scales the rank to `rank / (rank + 1)`."""
+
+SEARCH_RANK_CANDIDATES = 1000
+"""Maximum number of matching services ranked by a search, the ones with a
+match in the name are preferred."""
+
+
+class SearchFacets(t.NamedTuple):
+    """Number of services matching a search by facet value.
+
+    Attributes:
+        service_types: The count by service type.
+        institutions: The count by institution id.
+    """
+
+    service_types: t.Dict[ServiceTypes, int]
+    institutions: t.Dict[int, int]
+
+
+class SearchResult(t.NamedTuple):
+    """Result of a services search.
+
+    Attributes:
+        services: The services of the page.
+        total: The total of matching services, None if it was not counted.
+        facets: The facet counts, None if they were not requested.
+        fuzzy: True if nothing matched the query and the services are the
+            most similar ones instead, a "did you mean" result.
+    """
+
+    services: t.List[Service]
+    total: t.Union[int, None]
+    facets: t.Union[SearchFacets, None]
+    fuzzy: bool
+
+
+SearchMatch = t.Callable[[t.Any], "sa.ColumnElement[bool]"]
+"""Builds the search condition for the given `Service` entity or alias."""
+
+SearchKey = t.Tuple[int, str, t.Union[str, None], int, int, bool, bool]
+SearchEntry = t.Tuple[
+    t.Tuple[int, ...],
+    t.Union[int, None],
+    t.Union[SearchFacets, None],
+    bool,
+]
 
 
 class ServiceParams(t.TypedDict):
@@ -42,6 +113,16 @@ class ServiceService(BaseService):
 
     ServiceServiceError = ServiceServiceError
 
+    _search_cache: "LRUCache[SearchKey, SearchEntry]" = LRUCache(
+        SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+    )
+    _search_generation = 0
+
+    _suggest_terms = TermDictionary()
+    _suggest_lock = threading.Lock()
+    _suggest_stale = True
+    _suggest_dirty: t.Set[int] = set()
+
     @classmethod
     def get_services(cls) -> t.List[Service]:
         return db.session.query(Service).all()
@@ -72,8 +153,10 @@ class ServiceService(BaseService):
             laboratory=institution.name,
             **kwargs,
         )
+        service.visible = service.enabled and institution.enabled
         db.session.add(service)
-        db.session.commit()
+        db.session.flush()
+        cls.invalidate_search_cache(service.id)
 
         return service
 
@@ -88,61 +171,102 @@ class ServiceService(BaseService):
             None: If the service does not exist.
 
         Raises:
-            ServiceServiceError: If the service could not be updated.
+            ServiceServiceError: If the service is pending deletion or could
+                not be updated.
         """
         service = db.session.query(Service).get(service_id)
         if service is None:
             return None
+        if PurgeService.is_pending(PurgeTarget.SERVICE, service_id):
+            raise ServiceServiceError(
+                "El servicio está pendiente de eliminación"
+            )
 
         try:
             for key, value in kwargs.items():
                 setattr(service, key, value)
-            db.session.commit()
+            if "enabled" in kwargs:
+                institution_enabled = (
+                    db.session.query(Institution.enabled)
+                    .filter(Institution.id == service.institution_id)
+                    .scalar()
+                )
+                service.visible = service.enabled and bool(institution_enabled)
+            db.session.flush()
+            cls.invalidate_search_cache(service_id)
             return service
         except sa_exc.SQLAlchemyError as e:
-            db.session.rollback()
             raise ServiceServiceError(
                 f"Could not update service '{service_id}': {e.code}"
             )
 
     @classmethod
-    def delete_service(cls, service_id: int) -> bool:
-        """Deletes a service.
+    def delete_service(cls, service_id: int) -> t.Union[PurgeJob, None]:
+        """Marks a service as pending deletion.
 
-        The deletion is cascaded to all service requests and notes.
+        The service is disabled and hidden from the search right away, the
+        purge worker deletes its requests and notes in batches and then the
+        service, see `purge_service`.
 
         Returns:
-            bool: True if the service was deleted, False if the service was not
-                deleted or if the service did not exist.
+            The purge job of the service or None if the service does not
+            exist.
         """
-        # Delete using complex join are not supported by SQLAlchemy
-        (
-            db.session.query(RequestNote)
-            .filter(
-                RequestNote.id.in_(
-                    sa.select(RequestNote.id).join(
-                        ServiceRequest,
-                        sa.and_(
-                            ServiceRequest.id
-                            == RequestNote.service_request_id,
-                            ServiceRequest.service_id == service_id,
-                        ),
-                    )
-                )
-            )
-            .delete()
+        service = db.session.get(Service, service_id)
+        if service is None:
+            return None
+
+        service.enabled = False
+        service.visible = False
+        requests = sa.select(ServiceRequest.id).where(
+            ServiceRequest.service_id == service_id
         )
-        (
-            db.session.query(ServiceRequest)
-            .filter(ServiceRequest.service_id == service_id)
-            .delete()
+        total_rows = PurgeService.count_rows(
+            sa.select(RequestNote.id).where(
+                RequestNote.service_request_id.in_(requests)
+            ),
+            requests,
+            sa.select(Service.id).where(Service.id == service_id),
         )
-        delete_count = (
+        job = PurgeService.enqueue(PurgeTarget.SERVICE, service_id, total_rows)
+        cls.invalidate_search_cache(service_id)
+
+        return job
+
+    @classmethod
+    def purge_service(
+        cls, service_id: int, batch_size: int
+    ) -> t.Tuple[int, bool]:
+        """Deletes a batch of the notes and requests of a service pending
+        deletion, or the service once it has none left.
+
+        The purge handler of services, runs in the purge job transaction.
+        """
+        deleted = PurgeService.delete_batch(
+            RequestNote,
+            batch_size,
+            RequestNote.service_request_id.in_(
+                sa.select(ServiceRequest.id).where(
+                    ServiceRequest.service_id == service_id
+                )
+            ),
+        )
+        if deleted == 0:
+            deleted = PurgeService.delete_batch(
+                ServiceRequest,
+                batch_size,
+                ServiceRequest.service_id == service_id,
+                before=RequestService.discount_request_ids,
+            )
+        if deleted > 0:
+            return deleted, False
+
+        deleted = (
             db.session.query(Service).filter(Service.id == service_id).delete()
         )
-        db.session.commit()
+        cls.invalidate_search_cache(service_id)
 
-        return delete_count == 1
+        return deleted, True
 
     @classmethod
     def get_institution_services(cls, institution_id: int) -> t.List[Service]:
@@ -154,16 +278,13 @@ class ServiceService(BaseService):
 
     @classmethod
     def get_enabled_institution_services(
-        cls, institution_id: int, page: int, per_page: int
-    ) -> t.Tuple[t.List[Service], int]:
+        cls, institution_id: int, page: int, per_page: int, count: bool = True
+    ) -> t.Tuple[t.List[Service], t.Union[int, None]]:
         query = db.session.query(Service).filter(
             Service.institution_id == institution_id, Service.enabled
         )
 
-        total = query.count()
-        services = query.offset((page - 1) * per_page).limit(per_page).all()
-
-        return services, total
+        return pagination.paginate(query, page, per_page, count)
 
     @classmethod
     def get_institution_of(cls, service_id: int) -> t.Union[int, None]:
@@ -175,15 +296,176 @@ class ServiceService(BaseService):
 
     @classmethod
     def get_institution_services_paginated(
-        cls, institution_id: int, page: int, per_page: int
-    ) -> t.Tuple[t.List[Service], int]:
+        cls, institution_id: int, page: int, per_page: int, count: bool = True
+    ) -> t.Tuple[t.List[Service], t.Union[int, None]]:
         query = db.session.query(Service).filter(
             Service.institution_id == institution_id
         )
-        total = query.count()
-        services = query.offset((page - 1) * per_page).limit(per_page).all()
 
-        return services, total
+        return pagination.paginate(query, page, per_page, count)
+
+    @classmethod
+    def _on_search_notification(cls, payload: str) -> None:
+        cls._search_generation += 1
+        with cls._suggest_lock:
+            if payload.isdigit():
+                cls._suggest_dirty.add(int(payload))
+            else:
+                cls._suggest_stale = True
+
+    @classmethod
+    def invalidate_search_cache(
+        cls, service_id: t.Union[int, None] = None
+    ) -> None:
+        """Invalidates the cached search results in every process.
+
+        The generation counter is part of the cache key, so the previous
+        results are never read again and are evicted over time. Must be
+        called inside the transaction that changes the services.
+
+        Args:
+            service_id: The changed service, if None the suggestion terms
+                of every service are reloaded.
+        """
+        payload = "" if service_id is None else str(service_id)
+        cls._on_search_notification(payload)
+        notify.notify(SEARCH_CHANNEL, payload)
+
+    @classmethod
+    def update_institution_visibility(
+        cls, institution_id: int, enabled: bool
+    ) -> None:
+        """Updates the search visibility of the services of an institution.
+
+        The change is not committed, it is part of the caller transaction.
+        """
+        (
+            db.session.query(Service)
+            .filter(Service.institution_id == institution_id)
+            .update(
+                {Service.visible: Service.enabled if enabled else False},
+                synchronize_session=False,
+            )
+        )
+        cls.invalidate_search_cache()
+
+    @classmethod
+    def rebuild_search_vector(cls) -> None:
+        """Recreates the search columns of the services.
+
+        A generated column expression can't be altered, so the columns and
+        their indexes are dropped and created again with
+        `SEARCH_TSV_EXPRESSION` and `SEARCH_TRGM_EXPRESSION`. The `visible`
+        flag is added if missing and recomputed. Used to migrate existing
+        databases when the search columns change.
+        """
+        db.session.execute(
+            sa.text(
+                "ALTER TABLE services ADD COLUMN IF NOT EXISTS visible "
+                "boolean NOT NULL DEFAULT true"
+            )
+        )
+        db.session.execute(
+            sa.text(
+                "UPDATE services SET visible = services.enabled "
+                "AND institutions.enabled FROM institutions "
+                "WHERE institutions.id = services.institution_id"
+            )
+        )
+        columns = (
+            (
+                "search_tsv",
+                "tsvector",
+                SEARCH_TSV_EXPRESSION,
+                "idx_service_search_tsv",
+                "search_tsv",
+            ),
+            (
+                "search_trgm",
+                "text",
+                SEARCH_TRGM_EXPRESSION,
+                "idx_services_search_trgm",
+                "search_trgm gin_trgm_ops",
+            ),
+        )
+        for column, type, expression, index, index_column in columns:
+            db.session.execute(
+                sa.text(f"ALTER TABLE services DROP COLUMN IF EXISTS {column}")
+            )
+            db.session.execute(
+                sa.text(
+                    f"ALTER TABLE services ADD COLUMN {column} {type} "
+                    f"GENERATED ALWAYS AS ({expression}) STORED"
+                )
+            )
+            db.session.execute(
+                sa.text(
+                    f"CREATE INDEX {index} "
+                    f"ON services USING gin ({index_column}) WHERE visible"
+                )
+            )
+        cls.invalidate_search_cache()
+
+    @classmethod
+    def _refresh_suggest_terms(cls) -> None:
+        with cls._suggest_lock:
+            stale, dirty = cls._suggest_stale, cls._suggest_dirty
+            cls._suggest_stale, cls._suggest_dirty = False, set()
+
+        if not stale and not dirty:
+            return
+
+        query = sa.select(
+            Service.id,
+            sa.func.tsvector_to_array(
+                Service.search_tsv, type_=pg.ARRAY(sa.Text)
+            ),
+        ).where(Service.visible)
+        if not stale:
+            query = query.where(Service.id.in_(dirty))
+
+        try:
+            rows = db.session.execute(query).all()
+        except sa_exc.SQLAlchemyError:
+            with cls._suggest_lock:
+                cls._suggest_stale |= stale
+                cls._suggest_dirty |= dirty
+            raise
+
+        terms = {id: lexemes for id, lexemes in rows}
+        if stale:
+            cls._suggest_terms.replace(terms)
+            return
+
+        for id in dirty:
+            cls._suggest_terms.update(id, terms.get(id, ()))
+
+    @classmethod
+    def suggest_terms(
+        cls, prefix: str, limit: int = 10
+    ) -> t.List[t.Tuple[str, int]]:
+        """Suggests search terms starting with `prefix`.
+
+        The terms are the lexemes of the visible services search vector,
+        kept in memory and ranked by the number of services containing them.
+        The database is only queried to load the terms of changed services.
+
+        Returns:
+            Up to `limit` pairs of term and number of services.
+        """
+        cls._refresh_suggest_terms()
+        prefix = normalize_term(prefix)
+        if prefix == "":
+            return []
+
+        return cls._suggest_terms.suggest(prefix, limit)
+
+    @classmethod
+    def search_cache_stats(cls) -> t.Dict[str, t.Any]:
+        """Returns the hit rate of the search cache of this process."""
+        stats = cls._search_cache.stats()
+        stats["generation"] = cls._search_generation
+        return stats
 
     @classmethod
     def search_services(
@@ -192,49 +474,292 @@ class ServiceService(BaseService):
         service_type: t.Union[ServiceTypes, None],
         page: int,
         per_page: int,
-    ) -> t.Tuple[t.List[Service], int]:
+        count: bool = True,
+    ) -> t.Tuple[t.List[Service], t.Union[int, None]]:
+        """Searches services, see `search` for the details.
+
+        Returns:
+            The services of the page and the total of matching services.
+        """
+        result = cls.search(q, service_type, page, per_page, count)
+
+        return result.services, result.total
+
+    @classmethod
+    def search(
+        cls,
+        q: str,
+        service_type: t.Union[ServiceTypes, None],
+        page: int,
+        per_page: int,
+        count: bool = True,
+        facets: bool = False,
+    ) -> SearchResult:
         """Searches services.
 
         The search is performed by filtering services by name, description,
-        keywords, laboratory and service type.
+        keywords, laboratory and service type. Only the visible services are
+        searched, the ones enabled and of an enabled institution.
+
+        The query string is compiled into a tsquery with `compile_tsquery`,
+        so malformed input never reaches the database. Matches in the name
+        rank first, followed by keywords, laboratory and description. Only
+        `SEARCH_RANK_CANDIDATES` matches are ranked, the ones matching in the
+        name first, and the remaining matches follow them by id. The total
+        and the facets count every match. If nothing matches, the services
+        with a name or keywords similar to the query are returned instead
+        and the result is flagged as fuzzy.
+
+        The facets ignore `service_type`, so they describe every filter the
+        user can choose for the current text query. They are computed in the
+        same statement as the page of results.
+
+        The ids of the resulting page, the total and the facets are cached
+        by compiled tsquery, a cache hit only loads the services by primary
+        key.
 
         Args:
-            q: The query string.
+            q: The query string, supports quoted phrases and `-` exclusions.
             service_type: The service type to filter by.
             page: The page number.
             per_page: The number of services per page.
+            count: Whether to compute the total of matching services.
+            facets: Whether to count the matching services by service type
+                and by institution.
+        """
+        q = q.lower()
+        tsquery = compile_tsquery(q)
+        key: SearchKey = (
+            cls._search_generation,
+            tsquery or "",
+            None if service_type is None else service_type.name,
+            page,
+            per_page,
+            count,
+            facets,
+        )
+        entry = cls._search_cache.get(key)
+        if entry is not None:
+            ids, total, search_facets, fuzzy = entry
+            services: t.List[Service] = []
+            if len(ids) > 0:
+                by_id = {
+                    service.id: service
+                    for service in db.session.query(Service)
+                    .filter(Service.id.in_(ids))
+                    .all()
+                }
+                services = [by_id[id] for id in ids if id in by_id]
+            return SearchResult(services, total, search_facets, fuzzy)
+
+        result = cls._search_services(
+            tsquery,
+            search_text(q),
+            service_type,
+            page,
+            per_page,
+            count,
+            facets,
+        )
+        cls._search_cache.set(
+            key,
+            (
+                tuple(service.id for service in result.services),
+                result.total,
+                result.facets,
+                result.fuzzy,
+            ),
+        )
+
+        return result
+
+    @classmethod
+    def _search_facets_column(
+        cls, match: t.Union[SearchMatch, None]
+    ) -> "sa.ScalarSelect[t.Any]":
+        """Builds a scalar subquery with the facet counts as a json array of
+        `[service_type, institution_id, count]` rows.
+
+        Postgres evaluates it once per statement, the grouping sets compute
+        both facets in a single pass over the matching services.
         """
-        query = db.session.query(Service)
-        if q != "":
-            qterm = " & ".join(word + ":*" for word in q.split())
-            tsquery = sa.func.to_tsquery("argentino", qterm)
-            query = query.filter(Service.search_tsv.op("@@")(tsquery))
-            query = query.order_by(
-                sa.func.ts_rank(Service.search_tsv, tsquery).desc()
+        matched = sao.aliased(Service)
+        facet_rows = sa.select(
+            matched.service_type,
+            matched.institution_id,
+            sa.func.count().label("count"),
+        ).where(matched.visible)
+        if match is not None:
+            facet_rows = facet_rows.where(match(matched))
+        facet_rows = facet_rows.group_by(
+            sa.func.grouping_sets(
+                sa.tuple_(matched.service_type),
+                sa.tuple_(matched.institution_id),
             )
+        ).subquery()
+
+        return sa.select(
+            sa.func.coalesce(
+                sa.func.json_agg(
+                    sa.func.json_build_array(
+                        facet_rows.c.service_type,
+                        facet_rows.c.institution_id,
+                        facet_rows.c.count,
+                    )
+                ),
+                sa.text("'[]'::json"),
+            )
+        ).scalar_subquery()
+
+    @staticmethod
+    def _parse_facets(rows: t.List[t.Tuple[t.Any, ...]]) -> SearchFacets:
+        facets = SearchFacets({}, {})
+        for service_type, institution_id, count in rows:
+            if service_type is not None:
+                facets.service_types[ServiceTypes[service_type]] = count
+            else:
+                facets.institutions[institution_id] = count
 
+        return facets
+
+    @classmethod
+    def _search_page(
+        cls,
+        query: "sao.Query[Service]",
+        match: t.Union[SearchMatch, None],
+        service_type: t.Union[ServiceTypes, None],
+        page: int,
+        per_page: int,
+        count: bool,
+        facets: bool,
+    ) -> t.Tuple[
+        t.List[Service], t.Union[int, None], t.Union[SearchFacets, None]
+    ]:
+        if not facets:
+            services, total = pagination.paginate(query, page, per_page, count)
+            return services, total, None
+
+        facets_column = cls._search_facets_column(match)
+        rows, total = pagination.paginate(
+            query.add_columns(facets_column.label("facets")),
+            page,
+            per_page,
+            count,
+        )
+        if len(rows) > 0:
+            facet_rows = rows[0][1]
+        elif page == 1 and service_type is None:
+            # Nothing matches the text query, so every facet is empty
+            facet_rows = []
+        else:
+            facet_rows = db.session.execute(sa.select(facets_column)).scalar()
+
+        return (
+            [row[0] for row in rows],
+            total,
+            cls._parse_facets(facet_rows or []),
+        )
+
+    @classmethod
+    def _search_services(
+        cls,
+        tsquery: t.Union[str, None],
+        text: t.Union[str, None],
+        service_type: t.Union[ServiceTypes, None],
+        page: int,
+        per_page: int,
+        count: bool,
+        facets: bool,
+    ) -> SearchResult:
+        # The search indexes are partial, they only contain visible services
+        query = db.session.query(Service).filter(Service.visible)
         if service_type is not None:
             query = query.filter(Service.service_type == service_type)
 
-        total = query.count()
-        services = query.offset((page - 1) * per_page).limit(per_page).all()
+        if tsquery is None:
+            services, total, search_facets = cls._search_page(
+                query, None, service_type, page, per_page, count, facets
+            )
+            return SearchResult(services, total, search_facets, False)
 
-        return services, total
+        def text_match(entity: t.Any) -> "sa.ColumnElement[bool]":
+            return entity.search_tsv.op("@@")(
+                sa.func.to_tsquery("argentino", tsquery)
+            )
+
+        # Only a bounded set of candidates is ranked, so the ranking cost is
+        # bounded however broad the query is. The candidates are chosen by a
+        # cheap proxy of the rank, a match in the name (weight A) lexemes,
+        # and every match is still counted by the total and the facets
+        matches = query.filter(text_match(Service))
+        name_match = sa.func.ts_filter(
+            Service.search_tsv, sa.literal_column("'{a}'")
+        ).op("@@")(sa.func.to_tsquery("argentino", tsquery))
+        candidates = (
+            matches.with_entities(Service.id)
+            .order_by(name_match.desc(), Service.id)
+            .limit(SEARCH_RANK_CANDIDATES)
+        )
+        rank = sa.case(
+            (
+                Service.id.in_(candidates.subquery().select()),
+                sa.func.ts_rank(
+                    Service.search_tsv,
+                    sa.func.to_tsquery("argentino", tsquery),
+                    SEARCH_RANK_NORMALIZATION,
+                ),
+            ),
+            else_=sa.literal(-1.0),
+        )
+        ranked = matches.order_by(rank.desc(), Service.id)
+        services, total, search_facets = cls._search_page(
+            ranked, text_match, service_type, page, per_page, count, facets
+        )
+        if len(services) > 0 or text is None:
+            return SearchResult(services, total, search_facets, False)
+
+        if total is None:
+            no_matches = (
+                page == 1 or not db.session.query(matches.exists()).scalar()
+            )
+        else:
+            no_matches = total == 0
+        if not no_matches:
+            return SearchResult(services, total, search_facets, False)
+
+        def fuzzy_match(entity: t.Any) -> "sa.ColumnElement[bool]":
+            return sa.literal(text, sa.Text).op("<%")(entity.search_trgm)
+
+        similar = query.filter(fuzzy_match(Service)).order_by(
+            sa.func.word_similarity(text, Service.search_trgm).desc(),
+            Service.id,
+        )
+        services, total, search_facets = cls._search_page(
+            similar, fuzzy_match, service_type, page, per_page, count, facets
+        )
+
+        return SearchResult(services, total, search_facets, len(services) > 0)
 
     @classmethod
     def get_most_requested_services(
         cls,
         page: int,
         per_page: int,
-    ):
+        count: bool = True,
+    ) -> t.Tuple[t.List[t.Tuple[Service, int]], t.Union[int, None]]:
         query = (
-            db.session.query(Service, sa.func.count(ServiceRequest.id))
-            .join(ServiceRequest, ServiceRequest.service_id == Service.id)
-            .group_by(Service.id)
-            .order_by(sa.func.count(ServiceRequest.id).desc())
+            db.session.query(Service, Service.request_count)
+            .filter(Service.request_count > 0)
+            .order_by(
+                Service.request_count.desc(),
+                Service.last_requested_at.desc(),
+            )
         )
 
-        total = query.count()
-        services = query.offset((page - 1) * per_page).limit(per_page).all()
+        return pagination.paginate(query, page, per_page, count)
+
 
-        return services, total
+notify.subscribe(SEARCH_CHANNEL, ServiceService._on_search_notification)
+PurgeService.register_handler(
+    PurgeTarget.SERVICE, ServiceService.purge_service
+)
@@ -1,13 +1,22 @@
+import time
 import typing as t
 
 import typing_extensions as te
-from sqlalchemy import exc, insert, select, update
+from sqlalchemy import exc, insert, select, text, update
 
+from src.core import notify
 from src.core.db import db
 from src.core.models.site import SiteConfig, defaultSiteConfig
 from src.services.base import BaseService, BaseServiceError
 from src.utils import funcs
 
+SITE_CONFIG_CHANNEL = "site_config"
+"""Notification channel used to broadcast the site config version."""
+
+SITE_CONFIG_CACHE_TTL = 60.0
+"""Seconds before the cached site config is reloaded even without a
+notification, in case a broadcast is missed."""
+
 
 class SiteConfigParams(t.TypedDict):
     page_size: int
@@ -35,6 +44,10 @@ class SiteService(BaseService):
 
     SiteServiceError = SiteServiceError
 
+    _cached_config: t.Union[SiteConfig, None] = None
+    _cached_version: int = 0
+    _cached_at: float = 0.0
+
     @staticmethod
     def default_site_config() -> SiteConfig:
         return defaultSiteConfig()
@@ -44,25 +57,71 @@ class SiteService(BaseService):
         site_config = defaultSiteConfig()
         return site_config
 
+    @staticmethod
+    def _detached_copy(site_config: SiteConfig) -> SiteConfig:
+        """Copies the config into an object not bound to any session.
+
+        The cached config outlives the request session, so it can't be the
+        instance loaded by the session.
+        """
+        copy = SiteConfig(
+            page_size=site_config.page_size,
+            contact_info=site_config.contact_info,
+            maintenance_active=site_config.maintenance_active,
+            maintenance_message=site_config.maintenance_message,
+        )
+        copy.version = site_config.version
+        return copy
+
+    @classmethod
+    def _cache_site_config(cls, site_config: SiteConfig) -> SiteConfig:
+        cached = cls._detached_copy(site_config)
+        cls._cached_config = cached
+        cls._cached_version = cached.version
+        cls._cached_at = time.monotonic()
+        return cached
+
+    @classmethod
+    def _on_version_notification(cls, payload: str) -> None:
+        """Drops the cached config if another process saved a newer one."""
+        if not payload.isdigit() or int(payload) > cls._cached_version:
+            cls._cached_config = None
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        cls._cached_config = None
+
     @classmethod
     def get_site_config(cls) -> SiteConfig:
         """Gets the site config.
 
-        If the site config is missing, it will be created with the default.
+        The config is cached in the process and reloaded when another
+        process broadcasts a newer version or after `SITE_CONFIG_CACHE_TTL`
+        seconds. If the site config is missing, the default is returned and
+        cached as well.
 
         Raises:
             SiteServiceError: If the site config could not be retrieved.
         """
+        cached = cls._cached_config
+        if (
+            cached is not None
+            and time.monotonic() - cls._cached_at < SITE_CONFIG_CACHE_TTL
+        ):
+            return cached
+
         try:
             site_config = db.session.execute(select(SiteConfig)).scalar()
         except exc.SQLAlchemyError as e:
-            db.session.rollback()
             raise SiteServiceError(f"Could not retrieve site config: {e.code}")
 
         if site_config is None:
-            return cls._on_missing_site_config()
+            site_config = cls._on_missing_site_config()
+            # Older than any saved config, so it is dropped when the first
+            # one is broadcast
+            site_config.version = 0
 
-        return site_config
+        return cls._cache_site_config(site_config)
 
     @classmethod
     def update_site_config(
@@ -71,6 +130,8 @@ class SiteService(BaseService):
         """Updates the site config.
 
         If the site config is missing, it will be created with the default.
+        Every update bumps the config version and broadcasts it to every
+        process when the request commits, so they drop their cached copy.
 
         Raises:
             SiteServiceError: If the site config could not be updated.
@@ -78,12 +139,13 @@ class SiteService(BaseService):
         try:
             site_config = db.session.execute(
                 update(SiteConfig)
-                .values(**funcs.filter_nones(kwargs))
+                .values(
+                    **funcs.filter_nones(kwargs),
+                    version=SiteConfig.version + 1,
+                )
                 .returning(SiteConfig)
             ).scalar()
-            db.session.commit()
         except exc.SQLAlchemyError as e:
-            db.session.rollback()
             raise SiteServiceError(f"Could not update site config: {e.code}")
 
         if site_config is None:
@@ -91,9 +153,7 @@ class SiteService(BaseService):
                 site_config = db.session.execute(
                     insert(SiteConfig).values(**kwargs).returning(SiteConfig)
                 ).scalar()
-                db.session.commit()
             except exc.SQLAlchemyError as e:
-                db.session.rollback()
                 raise SiteServiceError(
                     f"Could not insert site config on missing config: {e.code}"
                 )
@@ -103,8 +163,25 @@ class SiteService(BaseService):
                     "Could not retrieve site config after insert"
                 )
 
+        # Not cached yet, the change may still be rolled back
+        cls.clear_cache()
+        notify.notify(SITE_CONFIG_CHANNEL, str(site_config.version))
+
         return site_config
 
+    @classmethod
+    def rebuild_site_config(cls) -> None:
+        """Adds the `version` column to the site config of an existing
+        database, the config is loaded on every request and fails without
+        it."""
+        db.session.execute(
+            text(
+                "ALTER TABLE site_config ADD COLUMN IF NOT EXISTS version "
+                "integer NOT NULL DEFAULT 1"
+            )
+        )
+        cls.clear_cache()
+
     @classmethod
     def maintenance_active(cls) -> bool:
         return cls.get_site_config().maintenance_active
@@ -112,3 +189,6 @@ class SiteService(BaseService):
     @classmethod
     def maintenance_message(cls) -> str:
         return cls.get_site_config().maintenance_message
+
+
+notify.subscribe(SITE_CONFIG_CHANNEL, SiteService._on_version_notification)
@@ -1,14 +1,20 @@
 import typing as t
 
+import sqlalchemy as sa
 import typing_extensions as te
 
 from src.core.bcrypt import bcrypt
 from src.core.db import db
-from src.core.enums import DocumentTypes, GenderOptions
+from src.core.enums import DocumentTypes, GenderOptions, PurgeTarget
 from src.core.models.auth import SiteAdmin, UserInstitutionRole
+from src.core.models.purge import PurgeJob
 from src.core.models.service_requests import RequestNote, ServiceRequest
 from src.core.models.user import User
+from src.services import pagination
 from src.services.base import BaseService, BaseServiceError
+from src.services.membership import MembershipService
+from src.services.purge import PurgeService
+from src.services.request import RequestService
 
 
 class UserParams(t.TypedDict):
@@ -50,18 +56,12 @@ class UserService(BaseService):
 
     @classmethod
     def get_users(
-        cls, page: int = 1, per_page: int = 10
-    ) -> t.Tuple[t.List[User], int]:
+        cls, page: int = 1, per_page: int = 10, count: bool = True
+    ) -> t.Tuple[t.List[User], t.Union[int, None]]:
         subquery = db.session.query(SiteAdmin.user_id)
-        users = (
-            db.session.query(User)
-            .filter(~User.id.in_(subquery))
-            .offset((page - 1) * per_page)
-            .limit(per_page)
-            .all()
-        )
-        total = db.session.query(User).count() - subquery.count()
-        return users, total
+        query = db.session.query(User).filter(~User.id.in_(subquery))
+
+        return pagination.paginate(query, page, per_page, count)
 
     @classmethod
     def get_user(cls, user_id: int) -> t.Union[User, None]:
@@ -75,22 +75,26 @@ class UserService(BaseService):
         if user:
             for key, value in kwargs.items():
                 setattr(user, key, value)
-            db.session.commit()
+            MembershipService.invalidate_user(user_id)
+            db.session.flush()
             return user
 
         return None
 
     @classmethod
-    def delete_user(cls, user_id: int) -> bool:
-        """Deletes a user.
+    def delete_user(cls, user_id: int) -> t.Union[PurgeJob, None]:
+        """Marks a user as pending deletion.
+
+        The user is deactivated and removed from its institutions right
+        away, the purge worker deletes its requests and notes in batches and
+        then the user, see `purge_user`.
 
         Returns:
-            True if the user was deleted, False otherwise.
+            The purge job of the user or None if the user does not exist.
 
         Raises:
             UserServiceError: If the user is a site admin.
         """
-        # Delete using complex join are not supported by SQLAlchemy
         if (
             db.session.query(SiteAdmin)
             .filter(SiteAdmin.user_id == user_id)
@@ -101,27 +105,66 @@ class UserService(BaseService):
                 f"User with id '{user_id}' can't be deleted"
             )
 
-        (
-            db.session.query(RequestNote)
-            .filter(RequestNote.user_id == user_id)
-            .delete()
-        )
-        (
-            db.session.query(ServiceRequest)
-            .filter(ServiceRequest.user_id == user_id)
-            .delete()
-        )
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+
+        user.is_active = False
         (
             db.session.query(UserInstitutionRole)
             .filter(UserInstitutionRole.user_id == user_id)
             .delete()
         )
-        delete_count = (
-            db.session.query(User).filter(User.id == user_id).delete()
+        requests = sa.select(ServiceRequest.id).where(
+            ServiceRequest.user_id == user_id
+        )
+        total_rows = PurgeService.count_rows(
+            sa.select(RequestNote.id).where(
+                sa.or_(
+                    RequestNote.user_id == user_id,
+                    RequestNote.service_request_id.in_(requests),
+                )
+            ),
+            requests,
+            sa.select(User.id).where(User.id == user_id),
         )
-        db.session.commit()
+        job = PurgeService.enqueue(PurgeTarget.USER, user_id, total_rows)
+        MembershipService.invalidate_user(user_id)
 
-        return delete_count == 1
+        return job
+
+    @classmethod
+    def purge_user(cls, user_id: int, batch_size: int) -> t.Tuple[int, bool]:
+        """Deletes a batch of the notes and requests of a user pending
+        deletion, or the user once it has none left.
+
+        The purge handler of users, runs in the purge job transaction.
+        """
+        deleted = PurgeService.delete_batch(
+            RequestNote,
+            batch_size,
+            sa.or_(
+                RequestNote.user_id == user_id,
+                RequestNote.service_request_id.in_(
+                    sa.select(ServiceRequest.id).where(
+                        ServiceRequest.user_id == user_id
+                    )
+                ),
+            ),
+        )
+        if deleted == 0:
+            deleted = PurgeService.delete_batch(
+                ServiceRequest,
+                batch_size,
+                ServiceRequest.user_id == user_id,
+                before=RequestService.discount_request_ids,
+            )
+        if deleted > 0:
+            return deleted, False
+
+        deleted = db.session.query(User).filter(User.id == user_id).delete()
+
+        return deleted, True
 
     @classmethod
     def create_user(
@@ -142,7 +185,7 @@ class UserService(BaseService):
         kwargs["password"] = hash.decode("utf-8")
         user = User(**kwargs)
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
 
     @classmethod
     def get_by_email(cls, email: str) -> t.Union[User, None]:
@@ -158,10 +201,20 @@ class UserService(BaseService):
 
     @classmethod
     def toggle_active(cls, user_id: int) -> t.Union[User, None]:
+        """Activates or deactivates a user.
+
+        Raises:
+            UserServiceError: If the user is pending deletion.
+        """
         user = db.session.query(User).get(user_id)
         if user:
+            if PurgeService.is_pending(PurgeTarget.USER, user_id):
+                raise UserServiceError(
+                    "El usuario está pendiente de eliminación"
+                )
             user.is_active = not user.is_active
-            db.session.commit()
+            MembershipService.invalidate_user(user_id)
+            db.session.flush()
             return user
 
         return None
@@ -213,7 +266,8 @@ class UserService(BaseService):
         active: t.Union[str, None],
         page: int = 1,
         per_page: int = 10,
-    ) -> t.Tuple[t.List[User], int]:
+        count: bool = True,
+    ) -> t.Tuple[t.List[User], t.Union[int, None]]:
         query = db.session.query(User)
 
         if email:
@@ -226,7 +280,7 @@ class UserService(BaseService):
 
         query = query.filter(~User.id.in_(db.session.query(SiteAdmin.user_id)))
 
-        total = query.count()
-        users = query.offset((page - 1) * per_page).limit(per_page).all()
+        return pagination.paginate(query, page, per_page, count)
+
 
-        return users, total
+PurgeService.register_handler(PurgeTarget.USER, UserService.purge_user)
@@ -0,0 +1,94 @@
+import collections
+import threading
+import time
+import typing as t
+
+K = t.TypeVar("K", bound=t.Hashable)
+V = t.TypeVar("V")
+
+_MISSING: t.Any = object()
+
+
+class LRUCache(t.Generic[K, V]):
+    """Thread safe, size bounded LRU cache with optional expiration.
+
+    Attributes:
+        maxsize: The maximum number of entries, the least recently used
+            entry is evicted when it is exceeded.
+        ttl: Seconds an entry stays valid, None for no expiration.
+        hits: The number of lookups that found a valid entry.
+        misses: The number of lookups that didn't find a valid entry.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: t.Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "collections.OrderedDict[K, t.Tuple[float, V]]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K, default: t.Optional[V] = None) -> t.Optional[V]:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            stored_at, value = entry
+            expired = (
+                self.ttl is not None
+                and time.monotonic() - stored_at > self.ttl
+            )
+            if expired:
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def get_or_set(self, key: K, factory: t.Callable[[], V]) -> V:
+        """Gets the value of `key` or stores the result of `factory`.
+
+        The factory is called without holding the lock, so concurrent misses
+        of the same key may call it more than once.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+
+        return value  # pyright: ignore[reportReturnType]
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        """Returns the size and the hit rate of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,74 @@
+import csv
+import datetime
+import enum
+import io
+import json
+import typing as t
+
+ExportFormat = t.Literal["csv", "ndjson"]
+
+EXPORT_MIMETYPES: t.Dict[str, str] = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+EXPORT_FLUSH_ROWS = 100
+"""Rows serialized before yielding a chunk of the response."""
+
+
+def _plain(value: t.Any) -> t.Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(
+    header: t.Sequence[str], rows: t.Iterable[t.Sequence[t.Any]]
+) -> t.Iterator[str]:
+    """Serializes `rows` as CSV, yielding chunks of lines.
+
+    The rows are consumed lazily, only `EXPORT_FLUSH_ROWS` rows are kept
+    in memory at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        pending += 1
+        if pending == EXPORT_FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    yield buffer.getvalue()
+
+
+def ndjson_lines(
+    header: t.Sequence[str], rows: t.Iterable[t.Sequence[t.Any]]
+) -> t.Iterator[str]:
+    """Serializes `rows` as newline delimited JSON objects keyed by
+    `header`, yielding chunks of lines."""
+    lines: t.List[str] = []
+    for row in rows:
+        item = {key: _plain(value) for key, value in zip(header, row)}
+        lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+        if len(lines) == EXPORT_FLUSH_ROWS:
+            yield "".join(lines)
+            lines.clear()
+
+    yield "".join(lines)
+
+
+def export_lines(
+    format: ExportFormat,
+    header: t.Sequence[str],
+    rows: t.Iterable[t.Sequence[t.Any]],
+) -> t.Iterator[str]:
+    if format == "ndjson":
+        return ndjson_lines(header, rows)
+    return csv_lines(header, rows)
@@ -0,0 +1,101 @@
+import bisect
+import heapq
+import threading
+import typing as t
+import unicodedata
+
+
+def normalize_term(term: str) -> str:
+    """Lowercases and removes the accents of `term`.
+
+    Mirrors the `unaccent` and `simple` dictionaries of the `argentino`
+    text search configuration.
+    """
+    decomposed = unicodedata.normalize("NFKD", term.strip().lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class TermDictionary:
+    """Thread safe sorted list of terms with their document frequency.
+
+    Each document contributes its set of terms, the frequency of a term is
+    the number of documents containing it. Prefix lookups are a binary
+    search over the sorted terms.
+    """
+
+    def __init__(self) -> None:
+        self._terms: t.List[str] = []
+        self._frequency: t.Dict[str, int] = {}
+        self._documents: t.Dict[int, t.FrozenSet[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def replace(self, documents: t.Mapping[int, t.Iterable[str]]) -> None:
+        """Replaces the whole dictionary with the terms of `documents`."""
+        frequency: t.Dict[str, int] = {}
+        terms_by_document: t.Dict[int, t.FrozenSet[str]] = {}
+        for id, terms in documents.items():
+            terms_by_document[id] = frozenset(terms)
+            for term in terms_by_document[id]:
+                frequency[term] = frequency.get(term, 0) + 1
+
+        with self._lock:
+            self._documents = terms_by_document
+            self._frequency = frequency
+            self._terms = sorted(frequency)
+
+    def _add_term(self, term: str) -> None:
+        count = self._frequency.get(term, 0)
+        if count == 0:
+            bisect.insort(self._terms, term)
+        self._frequency[term] = count + 1
+
+    def _remove_term(self, term: str) -> None:
+        count = self._frequency[term] - 1
+        if count > 0:
+            self._frequency[term] = count
+            return
+
+        del self._frequency[term]
+        index = bisect.bisect_left(self._terms, term)
+        del self._terms[index]
+
+    def update(self, id: int, terms: t.Iterable[str]) -> None:
+        """Sets the terms of a document, only the difference is applied."""
+        new_terms = frozenset(terms)
+        with self._lock:
+            old_terms = self._documents.get(id, frozenset())
+            for term in old_terms - new_terms:
+                self._remove_term(term)
+            for term in new_terms - old_terms:
+                self._add_term(term)
+            if new_terms:
+                self._documents[id] = new_terms
+            else:
+                self._documents.pop(id, None)
+
+    def remove(self, id: int) -> None:
+        self.update(id, ())
+
+    def suggest(
+        self, prefix: str, limit: int = 10
+    ) -> t.List[t.Tuple[str, int]]:
+        """Gets the most frequent terms starting with `prefix`.
+
+        Returns:
+            Up to `limit` pairs of term and frequency, the most frequent
+            first and ties in alphabetical order.
+        """
+        with self._lock:
+            start = bisect.bisect_left(self._terms, prefix)
+            end = bisect.bisect_left(self._terms, prefix + "\uffff", start)
+            matches = [
+                (term, self._frequency[term])
+                for term in self._terms[start:end]
+            ]
+
+        return heapq.nsmallest(
+            limit, matches, key=lambda match: (-match[1], match[0])
+        )
@@ -0,0 +1,71 @@
+import functools
+import re
+import typing as t
+
+_TOKEN_RE = re.compile(r'(-?)"([^"]*)"?|(-?)([^\s"]+)')
+_WORD_RE = re.compile(r"\w+")
+
+
+def _lexeme(word: str, prefix: bool = False) -> str:
+    # Words only contain \w characters, the quotes make the tsquery parser
+    # treat them as a single operand whatever the text search configuration
+    return f"'{word}':*" if prefix else f"'{word}'"
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_tsquery(text: str) -> t.Union[str, None]:
+    """Compiles user search input into a valid `to_tsquery` expression.
+
+    Supported syntax:
+        - `word`: services containing a word starting with `word`.
+        - `"some words"`: services containing the exact phrase.
+        - `-word` or `-"some words"`: services not containing it.
+
+    Operators and punctuation of the tsquery syntax are dropped, so the
+    result never makes `to_tsquery` fail. The result is memoized.
+
+    Returns:
+        The tsquery expression or None if the input has no word to search
+        for, exclusions alone don't filter the services.
+    """
+    include: t.List[str] = []
+    exclude: t.List[str] = []
+    for match in _TOKEN_RE.finditer(text):
+        phrase_negated, phrase, word_negated, word = match.groups()
+        is_phrase = phrase is not None
+        words = _WORD_RE.findall(phrase if is_phrase else word)
+        if len(words) == 0:
+            continue
+
+        # Words joined by punctuation, like `e-mail`, are kept adjacent
+        expr = " <-> ".join(_lexeme(w, prefix=not is_phrase) for w in words)
+        if len(words) > 1:
+            expr = f"({expr})"
+
+        negated = (phrase_negated if is_phrase else word_negated) == "-"
+        (exclude if negated else include).append(expr)
+
+    if len(include) == 0:
+        return None
+
+    return " & ".join(include + [f"!{expr}" for expr in exclude])
+
+
+@functools.lru_cache(maxsize=1024)
+def search_text(text: str) -> t.Union[str, None]:
+    """Gets the words of user search input that are not excluded.
+
+    Used to compare the input by similarity, the result is memoized.
+
+    Returns:
+        The words separated by spaces or None if there are none.
+    """
+    words: t.List[str] = []
+    for match in _TOKEN_RE.finditer(text):
+        phrase_negated, phrase, word_negated, word = match.groups()
+        is_phrase = phrase is not None
+        if (phrase_negated if is_phrase else word_negated) == "-":
+            continue
+        words.extend(_WORD_RE.findall(phrase if is_phrase else word))
+
+    return " ".join(words) or None
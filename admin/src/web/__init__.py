@@ -1,7 +1,11 @@
+import time
+
+import click
 from flask import Flask
 
 from flask_session import Session
-from src.core import config, cors, csrf, db, google, jwt
+from src.core import config, cors, csrf, db, google, jwt, notify
+from src.services.auth import AuthService
 from src.services.mail import MailService
 from src.web import controllers
 
@@ -14,10 +18,12 @@ def create_app(env: str = "development", static_folder: str = "../../static"):
     )
     config.init_app(app, env)
     db.init_app(app)
+    notify.init_app(app)
     csrf.init_app(app)
     cors.init_app(app)
     session.init_app(app)
     MailService.init_app(app)
+    AuthService.init_app(app)
     controllers.init_app(app)
     jwt.init_app(app)
     google.init_app(app)
@@ -37,7 +43,8 @@ def create_app(env: str = "development", static_folder: str = "../../static"):
 
         db.reset_db()
         seed.seed_db()
-        seed_dev.seed_db_dev()
+        with db.transaction():
+            seed_dev.seed_db_dev()
 
     @app.cli.command("seed-db")
     def seed_db():
@@ -51,6 +58,108 @@ def create_app(env: str = "development", static_folder: str = "../../static"):
         """Load test data for development."""
         from src.core import seed_dev
 
-        seed_dev.seed_db_dev()
+        with db.transaction():
+            seed_dev.seed_db_dev()
+
+    @app.cli.command("rebuild-request-counters")
+    def rebuild_request_counters():
+        """Rebuild the service requests rollups and resolution times, run
+        after rebuild-indexes on an existing database."""
+        from src.services.request import RequestService
+
+        with db.transaction():
+            rows = RequestService.rebuild_status_counters()
+            RequestService.rebuild_service_request_counts()
+            RequestService.rebuild_resolution_times()
+        print(f"[success]: {rows} request status counters rebuilt")
+
+    @app.cli.command("rebuild-indexes")
+    def rebuild_indexes():
+        """Migrate the tables, columns, foreign keys and indexes of an
+        existing database, run before the other rebuild commands."""
+        from src.services.database import DatabaseService
+
+        with db.transaction():
+            created = DatabaseService.rebuild_indexes()
+        for description in created:
+            print(f"[info]: created {description}")
+        print(f"[success]: {len(created)} foreign keys and indexes created")
+
+    @app.cli.command("explain-indexes")
+    @click.option("--requests", default=100_000, help="Synthetic requests.")
+    def explain_indexes(requests: int):
+        """Check that the main queries use their indexes (rolled back)."""
+        from src.core.explain_indexes import explain_indexes
+
+        if not explain_indexes(requests):
+            raise SystemExit(1)
+
+    @app.cli.command("rebuild-site-config")
+    def rebuild_site_config():
+        """Add the site config columns missing in an existing database."""
+        from src.services.site import SiteService
+
+        with db.transaction():
+            SiteService.rebuild_site_config()
+        print("[success]: site config rebuilt")
+
+    @app.cli.command("rebuild-purge-jobs")
+    def rebuild_purge_jobs():
+        """Add the purge jobs columns missing in an existing database."""
+        from src.services.purge import PurgeService
+
+        with db.transaction():
+            PurgeService.rebuild_purge_jobs()
+        print("[success]: purge jobs rebuilt")
+
+    @app.cli.command("rebuild-search-vector")
+    def rebuild_search_vector():
+        """Recreate the services search vector with the current weights."""
+        from src.services.service import ServiceService
+
+        with db.transaction():
+            ServiceService.rebuild_search_vector()
+        print("[success]: services search vector rebuilt")
+
+    @app.cli.command("bench-search")
+    @click.option("--services", default=100_000, help="Synthetic services.")
+    @click.option("--repeat", default=5, help="Runs per query.")
+    def bench_search(services: int, repeat: int):
+        """Time the service search over a synthetic catalog (rolled back)."""
+        from src.core.bench_search import bench_search
+
+        bench_search(services, repeat)
+
+    @app.cli.command("mail-worker")
+    @click.option("--once", is_flag=True, help="Process a single batch.")
+    @click.option("--batch-size", default=50, help="Emails per batch.")
+    @click.option("--interval", default=5.0, help="Seconds between polls.")
+    def mail_worker(once: bool, batch_size: int, interval: float):
+        """Send the emails queued in the mail outbox."""
+        while True:
+            sent = MailService.process_outbox(batch_size)
+            if once:
+                print(f"[success]: {sent} emails processed")
+                return
+            if sent < batch_size:
+                time.sleep(interval)
+
+    @app.cli.command("purge-worker")
+    @click.option("--once", is_flag=True, help="Process a single batch.")
+    @click.option("--batch-size", default=1000, help="Rows per batch.")
+    @click.option("--interval", default=5.0, help="Seconds between polls.")
+    def purge_worker(once: bool, batch_size: int, interval: float):
+        """Delete the institutions, services and users pending deletion."""
+        # The purge handlers are registered by the entity services, which
+        # are imported by the controllers
+        from src.services.purge import PurgeService
+
+        while True:
+            deleted = PurgeService.process_job(batch_size)
+            if once:
+                print(f"[success]: {deleted} rows deleted")
+                return
+            if deleted == 0:
+                time.sleep(interval)
 
     return app
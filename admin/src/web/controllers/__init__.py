@@ -32,14 +32,16 @@ def init_app(app: flask.Flask):
     for bp in _blueprints:
         app.register_blueprint(bp)
 
+    from src.core import permissions
     from src.services.auth import AuthService
-    from src.services.institution import InstitutionService
+    from src.services.membership import MembershipService
     from src.services.site import SiteService
-    from src.services.user import UserService
 
-    def user_has_permissions(_: t.Tuple[str, ...]) -> bool:
+    def user_has_permissions(_: t.Sequence[str]) -> bool:
         return False
 
+    setting_update = permissions.permissions_mask(("setting_update",))
+
     def get_institution_id(url_path: str) -> t.Union[int, None]:
         if not url_path.startswith("/institutions/"):
             return None
@@ -55,47 +57,50 @@ def init_app(app: flask.Flask):
             return None
 
         flask.g.user = None
-        flask.g.user_permissions = tuple()
+        flask.g.user_permissions = 0
         flask.g.user_has_permissions = user_has_permissions
         flask.g.institution_id = None
         flask.g.institutions = tuple()
 
-        user_id = flask.session.get("user_id")  # type: ignore
+        user_id: t.Union[int, None] = flask.session.get("user_id")
         if user_id is not None:
-            user = UserService.get_user(user_id)  # type: ignore
+            membership = MembershipService.get_membership(user_id)
 
-            if user is None:
+            if membership is None:
                 flask.session.clear()
             else:
-                flask.g.user = user
+                flask.g.user = membership.user
+                role_masks = AuthService.get_role_masks()
 
                 if flask.session.get("is_admin"):
-                    flask.g.user_permissions = (
-                        AuthService.get_site_admin_permissions(user.id)
-                    )
+                    role_id = membership.site_admin_role_id
+                    if role_id is not None:
+                        flask.g.user_permissions = role_masks.get(role_id, 0)
                     flask.g.institutions = (
-                        InstitutionService.get_all_institutions()
+                        MembershipService.get_all_institutions()
                     )
                 else:
                     institution_id = get_institution_id(flask.request.path)
                     flask.g.institution_id = institution_id
 
                     if institution_id is not None:
-                        flask.g.user_permissions = (
-                            AuthService.get_user_permissions(
-                                user.id, institution_id
-                            )
+                        role_id = membership.institution_roles.get(
+                            institution_id
                         )
-                    flask.g.institutions = (
-                        InstitutionService.get_user_institutions(user.id)
-                    )
+                        if role_id is not None:
+                            flask.g.user_permissions = role_masks.get(
+                                role_id, 0
+                            )
+                    flask.g.institutions = membership.institutions
 
         site_config = SiteService.get_site_config()
         flask.g.site_config = site_config
 
         if (
             not site_config.maintenance_active
-            or ("setting_update" in flask.g.user_permissions)
+            or permissions.has_permissions(
+                flask.g.user_permissions, setting_update
+            )
             or flask.request.path.startswith("/login")
             or flask.request.path.startswith("/logout")
         ):
@@ -4,6 +4,8 @@ from functools import wraps
 import flask
 from flask import typing as tf
 
+from src.core import permissions as perms
+
 
 def flash_info(message: str) -> None:
     flask.flash(message, "info")
@@ -64,23 +66,21 @@ def require_no_session(
     return decorator
 
 
+def has_permissions(required: t.Sequence[str]) -> bool:
+    """Checks the permissions of the current user against `required`."""
+    return perms.has_permissions(
+        flask.g.user_permissions or 0, perms.required_mask(tuple(required))
+    )
+
+
 def authenticated_route(
     module: str = "",
     permissions: t.Tuple[str, ...] = tuple(),
 ) -> t.Callable[[TRoute], TRoute]:
-    _permissions = tuple(
+    _required = perms.permissions_mask(
         f"{module}_{permission}" for permission in permissions
     )
-
-    def has_permissions(required: t.Tuple[str, ...]) -> bool:
-        user_permissions: t.Tuple[str, ...] = (
-            flask.g.user_permissions or tuple()
-        )
-
-        return all(
-            required_permission in user_permissions
-            for required_permission in required
-        )
+    _user_update = perms.permissions_mask(("user_update",))
 
     def decorator(func: TRoute) -> TRoute:
         @wraps(func)
@@ -88,14 +88,15 @@ def authenticated_route(
             if flask.g.user is None:
                 return flask.redirect("/login")
 
-            if not flask.g.user.is_active and not has_permissions(
-                ("user_update",)
+            user_permissions: int = flask.g.user_permissions or 0
+            if not flask.g.user.is_active and not perms.has_permissions(
+                user_permissions, _user_update
             ):
                 return flask.redirect("/account_disabled")
 
             flask.g.user_has_permissions = has_permissions
 
-            if not has_permissions(_permissions):
+            if not perms.has_permissions(user_permissions, _required):
                 return flask.redirect("/")
 
             return func(*args, **kwargs)
@@ -1,9 +1,14 @@
+import typing as t
+
 from flask import Blueprint, g, redirect, render_template, request
 
 from src.core.enums import GenderOptions
+from src.core.models.purge import PurgeJob
 from src.services.auth import AuthService
 from src.services.database import DatabaseService
 from src.services.institution import InstitutionService
+from src.services.purge import PurgeService
+from src.services.service import ServiceService
 from src.services.site import SiteService
 from src.services.user import UserService
 from src.utils import status
@@ -60,6 +65,50 @@ def check_db_get():
     return "Database is not running", status.HTTP_503_SERVICE_UNAVAILABLE
 
 
+@bp.get("/cache_stats")
+@h.authenticated_route(module="setting", permissions=("show",))
+def cache_stats_get():
+    # The caches are per process, the stats are of the worker serving this
+    return {
+        "service_search": ServiceService.search_cache_stats(),
+    }
+
+
+def _purge_job_dict(job: PurgeJob) -> t.Dict[str, t.Any]:
+    return {
+        "id": job.id,
+        "target": job.target.name,
+        "target_id": job.target_id,
+        "status": job.status.name,
+        "deleted_rows": job.deleted_rows,
+        "total_rows": job.total_rows,
+        "attempts": job.attempts,
+        "next_attempt_at": job.next_attempt_at.isoformat(),
+        "last_error": job.last_error,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": (
+            job.finished_at.isoformat() if job.finished_at else None
+        ),
+    }
+
+
+@bp.get("/purge_jobs")
+@h.authenticated_route(module="setting", permissions=("show",))
+def purge_jobs_get():
+    jobs = PurgeService.get_unfinished_jobs()
+    return {"data": [_purge_job_dict(job) for job in jobs]}
+
+
+@bp.get("/purge_jobs/<int:job_id>")
+@h.authenticated_route(module="setting", permissions=("show",))
+def purge_jobs_id_get(job_id: int):
+    job = PurgeService.get_job(job_id)
+    if job is None:
+        return {"error": "Tarea no encontrada"}, status.HTTP_404_NOT_FOUND
+
+    return _purge_job_dict(job)
+
+
 @bp.get("/users")
 @h.authenticated_route(
     module="user", permissions=("index", "create", "update", "destroy")
@@ -192,13 +241,16 @@ def users_id_delete_post(user_id: int):
         return redirect("/admin/users")
 
     try:
-        result = UserService.delete_user(user_id)
+        job = UserService.delete_user(user_id)
     except UserService.UserServiceError as e:
         h.flash_error(e.message)
         return redirect("/admin/users")
 
-    if result:
-        h.flash_success("Usuario eliminado con éxito.")
+    if job:
+        h.flash_success(
+            f"Usuario desactivado, se eliminará en segundo plano "
+            f"(tarea {job.id})."
+        )
         return redirect("/admin/users")
 
     h.flash_error("No se pudo eliminar el usuario.")
@@ -213,7 +265,11 @@ def users_id_toggle_active_post(user_id: int):
         h.flash_error(f"Usuario con id {user_id} no encontrado al actualizar.")
         return redirect("/admin/users")
 
-    UserService.toggle_active(user_id)
+    try:
+        UserService.toggle_active(user_id)
+    except UserService.UserServiceError as e:
+        h.flash_error(e.message)
+        return redirect("/admin/users")
     if user.is_active:
         h.flash_success("Usuario activado con éxito.")
     else:
@@ -313,7 +369,13 @@ def institutions_id_post(institution_id: int):
 
     form = InstitutionForm(request.form)
     if form.validate():
-        InstitutionService.update_institution(institution_id, **form.values())
+        try:
+            InstitutionService.update_institution(
+                institution_id, **form.values()
+            )
+        except InstitutionService.InstitutionServiceError as e:
+            h.flash_error(e.message)
+            return redirect("/admin/institutions")
         h.flash_success("Institución actualizada con éxito.")
         return redirect(f"/admin/institutions/{institution.id}")
 
@@ -344,9 +406,12 @@ def institutions_id_delete_post(institution_id: int):
         )
         return redirect("/admin/institutions")
 
-    result = InstitutionService.delete_institution(institution_id)
-    if result:
-        h.flash_success("Institución eliminada con éxito.")
+    job = InstitutionService.delete_institution(institution_id)
+    if job:
+        h.flash_success(
+            f"Institución deshabilitada, se eliminará en segundo plano "
+            f"(tarea {job.id})."
+        )
         return redirect("/admin/institutions")
 
     h.flash_error("No se pudo eliminar la institución.")
@@ -356,9 +421,13 @@ def institutions_id_delete_post(institution_id: int):
 @bp.post("/institutions/<int:institution_id>/enable")
 @h.authenticated_route(module="institution", permissions=("activate",))
 def institutions_id_enable_post(institution_id: int):
-    result = InstitutionService.update_institution(
-        institution_id, enabled=True
-    )
+    try:
+        result = InstitutionService.update_institution(
+            institution_id, enabled=True
+        )
+    except InstitutionService.InstitutionServiceError as e:
+        h.flash_error(e.message)
+        return redirect("/admin/institutions")
     if result:
         h.flash_success("Institución activada con éxito.")
     else:
@@ -370,9 +439,13 @@ def institutions_id_enable_post(institution_id: int):
 @bp.post("/institutions/<int:institution_id>/disable")
 @h.authenticated_route(module="institution", permissions=("deactivate",))
 def institutions_id_disable_post(institution_id: int):
-    result = InstitutionService.update_institution(
-        institution_id, enabled=False
-    )
+    try:
+        result = InstitutionService.update_institution(
+            institution_id, enabled=False
+        )
+    except InstitutionService.InstitutionServiceError as e:
+        h.flash_error(e.message)
+        return redirect("/admin/institutions")
     if result:
         h.flash_success("Institución desactivada con éxito.")
     else:
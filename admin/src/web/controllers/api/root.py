@@ -3,10 +3,12 @@ import flask
 from src.core import enums
 from src.services.auth import AuthService
 from src.services.institution import InstitutionService
-from src.services.request import RequestService
+from src.services.membership import MembershipService
+from src.services.pagination import PaginationError
+from src.services.request import EXPORT_COLUMNS, RequestService
 from src.services.service import ServiceService
 from src.services.user import UserService
-from src.utils import funcs, status
+from src.utils import export, funcs, status
 from src.web.controllers.api import base
 from src.web.forms import api as api_forms
 
@@ -46,7 +48,9 @@ def institutions_get(args: api_forms.PaginationFormValues):
         (
             raw_institutions,
             total,
-        ) = InstitutionService.get_institutions(page=page, per_page=per_page)
+        ) = InstitutionService.get_institutions(
+            page=page, per_page=per_page, count=args["count"]
+        )
     except InstitutionService.InstitutionServiceError:
         return base.API_INTERNAL_SERVER_ERROR_RESPONSE
 
@@ -136,14 +140,32 @@ def me_requests_get(args: api_forms.MeRequestsFormValues):
         ][0]
     )
 
+    cursor = args["cursor"]
+    next_cursor = None
+    total = None
     try:
-        raw_requests, total = RequestService.get_requests_by_user(
-            user_id,
-            page=page,
-            per_page=per_page,
-            status=status,
-            order=args["order"],
-        )
+        if cursor is None:
+            raw_requests, total = RequestService.get_requests_by_user(
+                user_id,
+                page=page,
+                per_page=per_page,
+                status=status,
+                order=args["order"],
+                count=args["count"],
+            )
+        else:
+            (
+                raw_requests,
+                next_cursor,
+            ) = RequestService.get_requests_by_user_keyset(
+                user_id,
+                cursor=cursor,
+                per_page=per_page,
+                status=status,
+                order=args["order"],
+            )
+    except PaginationError:
+        return base.API_BAD_REQUEST_RESPONSE
     except RequestService.RequestServiceError:
         return base.API_INTERNAL_SERVER_ERROR_RESPONSE
 
@@ -163,6 +185,13 @@ def me_requests_get(args: api_forms.MeRequestsFormValues):
         for req in raw_requests
     ]
 
+    if cursor is not None:
+        return {
+            "data": requests,
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+        }
+
     response = {
         "data": requests,
         "page": page,
@@ -206,6 +235,79 @@ def me_requests_id_get(request_id: int):
     return response
 
 
+@bp.get("/me/requests/<int:request_id>/bundle")
+@base.validation(method="GET", require_auth=True)
+def me_requests_id_bundle_get(request_id: int):
+    user_id = base.user_id_from_access_token()
+    per_page = flask.g.site_config.page_size
+    try:
+        bundle = RequestService.get_request_bundle(
+            request_id, notes_per_page=per_page
+        )
+    except RequestService.RequestServiceError:
+        return base.API_INTERNAL_SERVER_ERROR_RESPONSE
+
+    if bundle is None or bundle.request.user_id != user_id:
+        return base.API_UNAUTHORIZED_RESPONSE
+
+    request, service = bundle.request, bundle.service
+    response = {
+        "id": request.id,
+        "title": request.title,
+        "description": request.description,
+        "status": request.status.value,
+        "creation_date": funcs.date_as_yyyy_mm_dd(request.created_at),
+        "close_date": (
+            funcs.date_as_yyyy_mm_dd(request.closed_at)
+            if request.closed_at
+            else ""
+        ),
+        "user_id": request.user_id,
+        "service_id": request.service_id,
+        "service": {
+            "id": service.id,
+            "name": service.name,
+            "description": service.description,
+            "laboratory": service.laboratory,
+            "service_type": service.service_type.value,
+            "institution_id": service.institution_id,
+        },
+        "notes": {
+            "data": [
+                {
+                    "note": {
+                        "id": note.id,
+                        "text": note.note,
+                        "creation_date": funcs.date_as_yyyy_mm_dd(
+                            note.created_at
+                        ),
+                    },
+                    "user": {
+                        "id": author.id,
+                        "username": author.username,
+                        "email": author.email,
+                        "is_active": author.is_active,
+                    },
+                }
+                for note, author in bundle.notes
+            ],
+            "page": 1,
+            "per_page": per_page,
+            "total": bundle.notes_total,
+        },
+        "history": [
+            {
+                "status": change.status.value,
+                "observations": change.observations,
+                "date": funcs.date_as_yyyy_mm_dd(change.created_at),
+            }
+            for change in bundle.history
+        ],
+    }
+
+    return response
+
+
 @bp.post("/me/requests")
 @base.validation(api_forms.ServiceRequestForm, require_auth=True)
 def me_requests_post(body: api_forms.ServiceRequestFormValues):
@@ -248,9 +350,9 @@ def me_requests_post(body: api_forms.ServiceRequestFormValues):
 
 
 @bp.get("/me/requests/<int:request_id>/notes")
-@base.validation(api_forms.PaginationForm, method="GET", require_auth=True)
+@base.validation(api_forms.RequestNotesForm, method="GET", require_auth=True)
 def me_requests_id_notes_get(
-    request_id: int, args: api_forms.PaginationFormValues
+    request_id: int, args: api_forms.RequestNotesFormValues
 ):
     user_id = base.user_id_from_access_token()
     if not UserService.exist_user(user_id):
@@ -269,10 +371,23 @@ def me_requests_id_notes_get(
 
     page = args["page"]
     per_page = args["per_page"] or flask.g.site_config.page_size
+    cursor = args["cursor"]
+    next_cursor = None
+    total = None
     try:
-        raw_notes, total = RequestService.get_requests_notes_with_users(
-            request_id, page=page, per_page=per_page
-        )
+        if cursor is None:
+            raw_notes, total = RequestService.get_requests_notes_with_users(
+                request_id, page=page, per_page=per_page, count=args["count"]
+            )
+        else:
+            (
+                raw_notes,
+                next_cursor,
+            ) = RequestService.get_requests_notes_with_users_keyset(
+                request_id, cursor=cursor, per_page=per_page
+            )
+    except PaginationError:
+        return base.API_BAD_REQUEST_RESPONSE
     except RequestService.RequestServiceError:
         return base.API_INTERNAL_SERVER_ERROR_RESPONSE
 
@@ -293,6 +408,13 @@ def me_requests_id_notes_get(
         for note, user in raw_notes
     ]
 
+    if cursor is not None:
+        return {
+            "data": notes,
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+        }
+
     response = {
         "data": notes,
         "page": page,
@@ -303,6 +425,52 @@ def me_requests_id_notes_get(
     return response
 
 
+@bp.get("/me/requests/<int:request_id>/timeline")
+@base.validation(
+    api_forms.RequestTimelineForm, method="GET", require_auth=True
+)
+def me_requests_id_timeline_get(
+    request_id: int, args: api_forms.RequestTimelineFormValues
+):
+    user_id = base.user_id_from_access_token()
+    request = RequestService.get_request(request_id)
+    if request is None or request.user_id != user_id:
+        return base.API_UNAUTHORIZED_RESPONSE
+
+    per_page = args["per_page"] or flask.g.site_config.page_size
+    try:
+        events, next_cursor = RequestService.get_request_timeline(
+            request_id,
+            cursor=args["cursor"],
+            per_page=per_page,
+            order=args["order"],
+        )
+    except PaginationError:
+        return base.API_BAD_REQUEST_RESPONSE
+
+    response = {
+        "data": [
+            {
+                "kind": event.kind,
+                "id": event.id,
+                "date": event.created_at.isoformat(),
+                "text": event.text,
+                "status": event.status.value if event.status else None,
+                "user": (
+                    {"id": event.user_id, "username": event.username}
+                    if event.kind == "note"
+                    else None
+                ),
+            }
+            for event in events
+        ],
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+    }
+
+    return response
+
+
 @bp.post("/me/requests/<int:request_id>/notes")
 @base.validation(api_forms.RequestNoteForm, require_auth=True)
 def me_requests_id_notes_post(
@@ -345,8 +513,13 @@ def services_search_get(args: api_forms.ServiceSearchFormValues):
             service_type = enums.ServiceTypes.DEVELOPMENT
 
     try:
-        raw_services, total = ServiceService.search_services(
-            q, service_type, page, per_page
+        result = ServiceService.search(
+            q,
+            service_type,
+            page,
+            per_page,
+            count=args["count"],
+            facets=args["facets"],
         )
     except ServiceService.ServiceServiceError:
         return base.API_INTERNAL_SERVER_ERROR_RESPONSE
@@ -361,14 +534,56 @@ def services_search_get(args: api_forms.ServiceSearchFormValues):
             "enabled": service.enabled,
             "service_type": service.service_type.value,
         }
-        for service in raw_services
+        for service in result.services
     ]
 
     response = {
         "data": services,
         "page": page,
         "per_page": per_page,
-        "total": total,
+        "total": result.total,
+        "fuzzy": result.fuzzy,
+    }
+
+    facets = result.facets
+    if facets is not None:
+        institution_names = {
+            institution.id: institution.name
+            for institution in MembershipService.get_all_institutions()
+        }
+        response["facets"] = {
+            "service_type": [
+                {"service_type": service_type.value, "count": count}
+                for service_type, count in facets.service_types.items()
+            ],
+            "institution": [
+                {
+                    "id": institution_id,
+                    "name": institution_names.get(institution_id, ""),
+                    "count": count,
+                }
+                for institution_id, count in facets.institutions.items()
+            ],
+        }
+
+    return response
+
+
+@bp.get("/services/suggest")
+@base.validation(api_forms.ServiceSuggestForm, method="GET")
+def services_suggest_get(args: api_forms.ServiceSuggestFormValues):
+    try:
+        suggestions = ServiceService.suggest_terms(
+            args["prefix"], args["limit"]
+        )
+    except ServiceService.ServiceServiceError:
+        return base.API_INTERNAL_SERVER_ERROR_RESPONSE
+
+    response = {
+        "data": [
+            {"term": term, "services": services}
+            for term, services in suggestions
+        ]
     }
 
     return response
@@ -444,7 +659,9 @@ def stats_most_requested_services_get():
     if not user_is_site_admin and len(user_institutions) == 0:
         return base.API_UNAUTHORIZED_RESPONSE
 
-    services, _ = ServiceService.get_most_requested_services(1, 10)
+    services, _ = ServiceService.get_most_requested_services(
+        1, 10, count=False
+    )
 
     response = {
         "data": [
@@ -497,6 +714,44 @@ def stats_most_efficient_institutions_get():
     return response
 
 
+@bp.get("/institutions/<int:institution_id>/requests/export")
+@base.validation(api_forms.RequestsExportForm, method="GET", require_auth=True)
+def institutions_id_requests_export_get(
+    institution_id: int, args: api_forms.RequestsExportFormValues
+):
+    user_id = base.user_id_from_access_token()
+    user_institutions = InstitutionService.get_institutions_owned_by_user(
+        user_id
+    )
+    user_is_owner = any(
+        institution.id == institution_id for institution in user_institutions
+    )
+    if not user_is_owner and not AuthService.user_is_site_admin(user_id):
+        return base.API_UNAUTHORIZED_RESPONSE
+
+    format = args["format"]
+    filters = funcs.filter_nones(
+        funcs.omit(args, ("format", "service_id"))  # type: ignore
+    )
+    rows = RequestService.iter_requests_export(
+        institution_id=institution_id,
+        service_id=args["service_id"],
+        **filters,
+    )
+
+    return flask.Response(
+        flask.stream_with_context(
+            export.export_lines(format, EXPORT_COLUMNS, rows)
+        ),
+        mimetype=export.EXPORT_MIMETYPES[format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="solicitudes_{institution_id}.{format}"'
+            )
+        },
+    )
+
+
 @bp.get("/me/rol/site_admin")
 @base.validation(method="GET", require_auth=True)
 def me_rol_site_admin_get():
@@ -540,7 +795,7 @@ def enabled_institutions_get(args: api_forms.PaginationFormValues):
             raw_institutions,
             total,
         ) = InstitutionService.get_enabled_institutions(
-            page=page, per_page=per_page
+            page=page, per_page=per_page, count=args["count"]
         )
     except InstitutionService.InstitutionServiceError:
         return base.API_INTERNAL_SERVER_ERROR_RESPONSE
@@ -573,7 +828,10 @@ def enabled_institutions_id_services_get(
             raw_services,
             total,
         ) = ServiceService.get_enabled_institution_services(
-            institution_id=institution_id, page=page, per_page=per_page
+            institution_id=institution_id,
+            page=page,
+            per_page=per_page,
+            count=args["count"],
         )
     except ServiceService.ServiceServiceError:
         return base.API_INTERNAL_SERVER_ERROR_RESPONSE
@@ -15,7 +15,13 @@ def index_get():
     if len(g.institutions) == 0:
         return redirect("/")
 
-    return render_template("institutions/index.html")
+    institutions = InstitutionService.get_institutions_by_ids(
+        [institution.id for institution in g.institutions]
+    )
+
+    return render_template(
+        "institutions/index.html", institutions=institutions
+    )
 
 
 @bp.get("/<int:institution_id>")
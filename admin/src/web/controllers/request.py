@@ -1,10 +1,28 @@
-from flask import Blueprint, g, redirect, render_template, request
+import typing as t
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    g,
+    redirect,
+    render_template,
+    request,
+    stream_with_context,
+)
 
 from src.core.enums import RequestStatus
-from src.services.request import FilterRequestParams, RequestService
-from src.utils import status
+from src.services.pagination import PaginationError
+from src.services.request import (
+    EXPORT_COLUMNS,
+    FilterRequestParams,
+    RequestService,
+    StatusTransition,
+)
+from src.utils import export, status
 from src.web.controllers import _helpers as h
 from src.web.forms.request import (
+    RequestBulkHistoryForm,
     RequestForm,
     RequestHistoryForm,
     RequestNoteForm,
@@ -13,6 +31,17 @@ from src.web.forms.request import (
 bp = Blueprint("requests", __name__)
 
 
+def url_filter_args() -> FilterRequestParams:
+    """Get the service request filters from url args."""
+    kwargs: FilterRequestParams = {}
+    for key in ("user_email", "status", "start_date", "end_date"):
+        value = request.args.get(key, "")
+        if value != "":
+            kwargs[key] = value  # type:ignore
+
+    return kwargs
+
+
 @bp.get("/")
 @h.authenticated_route(module="service_request", permissions=("index", "show"))
 def requests_get(institution_id: int, service_id: int):
@@ -24,28 +53,41 @@ def requests_get(institution_id: int, service_id: int):
     start_date = request.args.get("start_date", "")
     end_date = request.args.get("end_date", "")
 
-    kwargs: FilterRequestParams = {}
-    if user_email != "":
-        kwargs["user_email"] = user_email
-    if request_status != "":
-        kwargs["status"] = request_status  # type:ignore
-    if start_date != "":
-        kwargs["start_date"] = start_date
-    if end_date != "":
-        kwargs["end_date"] = end_date
-
-    (
-        requests,
-        total,
-    ) = RequestService.get_requests_filter_by_service(
-        per_page=per_page,
-        page=page,
-        institution_id=institution_id,
-        service_id=service_id,
-        **kwargs,
-    )
-
-    statuses = [req_status.value for req_status in RequestStatus]
+    kwargs = url_filter_args()
+
+    cursor = request.args.get("cursor")
+    next_cursor = None
+    total = 0
+    if cursor is None:
+        (
+            requests,
+            total,
+        ) = RequestService.get_requests_filter_by_service(
+            per_page=per_page,
+            page=page,
+            institution_id=institution_id,
+            service_id=service_id,
+            **kwargs,
+        )
+    else:
+        try:
+            (
+                requests,
+                next_cursor,
+            ) = RequestService.get_requests_filter_by_service_keyset(
+                cursor=cursor,
+                per_page=per_page,
+                institution_id=institution_id,
+                service_id=service_id,
+                **kwargs,
+            )
+        except PaginationError as e:
+            h.flash_error(e.message)
+            return redirect(
+                f"/institutions/{institution_id}/services/{service_id}/requests"  # noqa: E501
+            )
+
+    statuses = [(choice.name, choice.value) for choice in RequestStatus]
     return render_template(
         "institutions/[id]/services/[id]/requests/index.html",
         requests=requests,
@@ -54,6 +96,8 @@ def requests_get(institution_id: int, service_id: int):
         page=page,
         per_page=per_page,
         total=total,
+        cursor=cursor,
+        next_cursor=next_cursor,
         statuses=statuses,
         user_email=user_email,
         status=request_status,
@@ -62,6 +106,35 @@ def requests_get(institution_id: int, service_id: int):
     )
 
 
+@bp.get("/export")
+@h.authenticated_route(module="service_request", permissions=("index", "show"))
+def requests_export_get(institution_id: int, service_id: int):
+    format = request.args.get("format", "csv")
+    if format not in export.EXPORT_MIMETYPES:
+        h.flash_error(f"Formato de exportacion '{format}' invalido")
+        return redirect(
+            f"/institutions/{institution_id}/services/{service_id}/requests"
+        )
+
+    rows = RequestService.iter_requests_export(
+        institution_id=institution_id,
+        service_id=service_id,
+        **url_filter_args(),
+    )
+
+    return Response(
+        stream_with_context(
+            export.export_lines(format, EXPORT_COLUMNS, rows)  # type:ignore
+        ),
+        mimetype=export.EXPORT_MIMETYPES[format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="solicitudes_{service_id}.{format}"'
+            )
+        },
+    )
+
+
 @bp.get("/new")
 @h.authenticated_route(module="service_request", permissions=("create",))
 def requests_new_get(institution_id: int, service_id: int):
@@ -100,6 +173,45 @@ def requests_new_post(institution_id: int, service_id: int):
     )
 
 
+@bp.post("/bulk_status")
+@h.authenticated_route(module="service_request", permissions=("update",))
+def requests_bulk_status_post(institution_id: int, service_id: int):
+    requests_url = (
+        f"/institutions/{institution_id}/services/{service_id}/requests"
+    )
+    form = RequestBulkHistoryForm(request.form)
+    if not form.validate():
+        for errors in form.errors.values():
+            for error in errors:
+                h.flash_error(str(error))
+        return redirect(requests_url)
+
+    values = form.values()
+    results = RequestService.update_state_requests(
+        institution_id,
+        service_id,
+        form.request_ids.data or [],
+        status=values["status"],
+        observations=values["observations"],
+    )
+
+    ids_by_result: t.Dict[StatusTransition, t.List[str]] = {}
+    for request_id, result in results.items():
+        ids_by_result.setdefault(result, []).append(f"#{request_id}")
+
+    updated = ids_by_result.get(StatusTransition.UPDATED, [])
+    if updated:
+        h.flash_success(f"{len(updated)} solicitudes actualizadas.")
+    unchanged = ids_by_result.get(StatusTransition.UNCHANGED, [])
+    if unchanged:
+        h.flash_info(f"Ya tenían ese estado: {', '.join(unchanged)}.")
+    not_found = ids_by_result.get(StatusTransition.NOT_FOUND, [])
+    if not_found:
+        h.flash_error(f"Solicitudes no encontradas: {', '.join(not_found)}.")
+
+    return redirect(requests_url)
+
+
 @bp.get("/<int:request_id>")
 @h.authenticated_route(module="service_request", permissions=("update",))
 def requests_id_edit_get(
@@ -164,14 +276,24 @@ def requests_id_edit_post(
 def requests_id_notes_get(
     institution_id: int, service_id: int, request_id: int
 ):
-    notes = RequestService.get_request_notes(request_id)
-    request_details = RequestService.get_service_request_details(request_id)
+    bundle = RequestService.get_request_bundle(
+        request_id, notes_per_page=g.site_config.page_size
+    )
+    if bundle is None:
+        h.flash_error("Solicitud no encontrada.")
+        return redirect(
+            f"/institutions/{institution_id}/services/{service_id}/requests"
+        )
+    if (
+        bundle.service.id != service_id
+        or bundle.service.institution_id != institution_id
+    ):
+        abort(status.HTTP_404_NOT_FOUND)
 
     return render_template(
         "institutions/[id]/services/[id]/requests/notes.html",
-        notes=notes,
+        bundle=bundle,
         institution_id=institution_id,
-        request_details=request_details,
         service_id=service_id,
         request_id=request_id,
     )
@@ -220,11 +342,30 @@ def requests_id_notes_new_post(
 def requests_id_notes_history_post(
     institution_id: int, service_id: int, request_id: int
 ):
-    history = RequestService.get_request_history(request_id)
+    service_request = RequestService.get_request(request_id)
+    if (
+        service_request is None
+        or service_request.service_id != service_id
+        or service_request.institution_id != institution_id
+    ):
+        abort(status.HTTP_404_NOT_FOUND)
+
+    cursor = request.args.get("cursor") or None
+    try:
+        events, next_cursor = RequestService.get_request_timeline(
+            request_id, cursor=cursor, per_page=g.site_config.page_size
+        )
+    except PaginationError as e:
+        h.flash_error(e.message)
+        return redirect(
+            f"/institutions/{institution_id}/services/{service_id}/requests/{request_id}/history"  # noqa: E501
+        )
 
     return render_template(
         "institutions/[id]/services/[id]/requests/history.html",
-        history=history,
+        events=events,
+        cursor=cursor,
+        next_cursor=next_cursor,
         institution_id=institution_id,
         service_id=service_id,
         request_id=request_id,
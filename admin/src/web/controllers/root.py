@@ -14,7 +14,7 @@ from flask import (
 from src.core.enums import DocumentTypes, GenderOptions, RegisterTypes
 from src.core.google import oauth
 from src.services.auth import AuthService
-from src.services.mail import MailService
+from src.services.mail import REGISTER_CONFIRMATION_TEMPLATE, MailService
 from src.services.user import UserService
 from src.utils import status
 from src.web.controllers import _helpers as h
@@ -136,7 +136,9 @@ def pre_register_post():
     MailService.send_mail(
         "Confirmacion de Registro",
         user.email,
-        f'Finalice el registro entrando a <a href="{register_link}">este link</a> completando la informacion restante.',  # noqa: E501
+        enqueue=True,
+        template=REGISTER_CONFIRMATION_TEMPLATE,
+        context={"register_link": register_link},
     )
     return render_template("info_register.html")
 
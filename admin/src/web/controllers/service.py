@@ -99,8 +99,8 @@ def services_id_post(institution_id: int, service_id: int):
 
     try:
         result = ServiceService.update_service(service_id, **form.values())
-    except ServiceService.ServiceServiceError:
-        h.flash_info("No se pudo actualizar el servicio")
+    except ServiceService.ServiceServiceError as e:
+        h.flash_info(f"No se pudo actualizar el servicio: {e.message}")
         return (
             render_template(
                 "institutions/[id]/services/update.html",
@@ -130,9 +130,11 @@ def services_id_delete(institution_id: int, service_id: int):
         )
         return redirect(f"/institutions/{institution_id}/services")
 
-    result = ServiceService.delete_service(service_id)
-    if result:
-        h.flash_success("Servicio eliminado exitosamente")
+    job = ServiceService.delete_service(service_id)
+    if job:
+        h.flash_success(
+            "Servicio deshabilitado, se eliminará en segundo plano"
+        )
         return redirect(f"/institutions/{institution_id}/services")
 
     h.flash_error("No se pudo eliminar el servicio")
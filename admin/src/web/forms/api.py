@@ -4,6 +4,8 @@ import wtforms
 from flask_wtf import FlaskForm
 from wtforms import validators as v
 
+from src.core.enums import RequestStatus
+
 
 class AuthFormValues(t.TypedDict):
     password: str
@@ -34,6 +36,7 @@ class AuthForm(FlaskForm):
 class PaginationFormValues(t.TypedDict):
     page: int
     per_page: t.Union[int, None]
+    count: bool
 
 
 class PaginationForm(FlaskForm):
@@ -43,9 +46,35 @@ class PaginationForm(FlaskForm):
     per_page = wtforms.IntegerField(
         validators=[v.Optional(), v.NumberRange(min=1, max=100)],
     )
+    count = wtforms.StringField(
+        validators=[v.Optional(), v.AnyOf(("true", "false"))],
+    )
 
     def values(self) -> PaginationFormValues:
-        return {"page": self.page.data or 1, "per_page": self.per_page.data}
+        return {
+            "page": self.page.data or 1,
+            "per_page": self.per_page.data,
+            "count": self.count.data != "false",
+        }
+
+
+class RequestNotesFormValues(t.TypedDict):
+    page: int
+    per_page: t.Union[int, None]
+    cursor: t.Union[str, None]
+    count: bool
+
+
+class RequestNotesForm(PaginationForm):
+    cursor = wtforms.StringField(
+        validators=[v.Optional(), v.Length(min=0, max=128)],
+    )
+
+    def values(self) -> RequestNotesFormValues:
+        return {
+            **super().values(),
+            "cursor": self.cursor.data,
+        }
 
 
 class ServiceRequestFormValues(t.TypedDict):
@@ -103,6 +132,8 @@ class ServiceSearchFormValues(t.TypedDict):
     type: str
     page: int
     per_page: t.Union[int, None]
+    count: bool
+    facets: bool
 
 
 class ServiceSearchForm(FlaskForm):
@@ -120,6 +151,12 @@ class ServiceSearchForm(FlaskForm):
     per_page = wtforms.IntegerField(
         validators=[v.Optional(), v.NumberRange(min=1, max=100)],
     )
+    count = wtforms.StringField(
+        validators=[v.Optional(), v.AnyOf(("true", "false"))],
+    )
+    facets = wtforms.StringField(
+        validators=[v.Optional(), v.AnyOf(("true", "false"))],
+    )
 
     def values(self) -> ServiceSearchFormValues:
         return {  # type: ignore
@@ -127,6 +164,31 @@ class ServiceSearchForm(FlaskForm):
             "type": self.type.data,
             "page": self.page.data or 1,
             "per_page": self.per_page.data,
+            "count": self.count.data != "false",
+            "facets": self.facets.data == "true",
+        }
+
+
+class ServiceSuggestFormValues(t.TypedDict):
+    prefix: str
+    limit: int
+
+
+class ServiceSuggestForm(FlaskForm):
+    prefix = wtforms.StringField(
+        validators=[
+            v.DataRequired("Este campo es requerido"),
+            v.Length(min=1, max=32),
+        ],
+    )
+    limit = wtforms.IntegerField(
+        validators=[v.Optional(), v.NumberRange(min=1, max=20)],
+    )
+
+    def values(self) -> ServiceSuggestFormValues:
+        return {  # type: ignore
+            "prefix": self.prefix.data,
+            "limit": self.limit.data or 10,
         }
 
 
@@ -135,6 +197,8 @@ class MeRequestsFormValues(t.TypedDict):
     order: t.Union[t.Literal["asc", "desc"], None]
     page: int
     per_page: t.Union[int, None]
+    cursor: t.Union[str, None]
+    count: bool
 
 
 class MeRequestsForm(FlaskForm):
@@ -150,6 +214,12 @@ class MeRequestsForm(FlaskForm):
     per_page = wtforms.IntegerField(
         validators=[v.Optional(), v.NumberRange(min=1, max=100)],
     )
+    cursor = wtforms.StringField(
+        validators=[v.Optional(), v.Length(min=0, max=128)],
+    )
+    count = wtforms.StringField(
+        validators=[v.Optional(), v.AnyOf(("true", "false"))],
+    )
 
     def values(self) -> MeRequestsFormValues:
         return {  # type: ignore
@@ -157,4 +227,82 @@ class MeRequestsForm(FlaskForm):
             "order": self.order.data,
             "page": self.page.data or 1,
             "per_page": self.per_page.data,
+            "cursor": self.cursor.data,
+            "count": self.count.data != "false",
+        }
+
+
+class RequestTimelineFormValues(t.TypedDict):
+    order: t.Literal["asc", "desc"]
+    per_page: t.Union[int, None]
+    cursor: t.Union[str, None]
+
+
+class RequestTimelineForm(FlaskForm):
+    order = wtforms.StringField(
+        validators=[v.Optional(), v.AnyOf(("asc", "desc"))],
+    )
+    per_page = wtforms.IntegerField(
+        validators=[v.Optional(), v.NumberRange(min=1, max=100)],
+    )
+    cursor = wtforms.StringField(
+        validators=[v.Optional(), v.Length(min=0, max=128)],
+    )
+
+    def values(self) -> RequestTimelineFormValues:
+        return {  # type: ignore
+            "order": self.order.data or "desc",
+            "per_page": self.per_page.data,
+            "cursor": self.cursor.data or None,
+        }
+
+
+class RequestsExportFormValues(t.TypedDict):
+    format: t.Literal["csv", "ndjson"]
+    service_id: t.Union[int, None]
+    status: t.Union[RequestStatus, None]
+    user_email: t.Union[str, None]
+    start_date: t.Union[str, None]
+    end_date: t.Union[str, None]
+
+
+class RequestsExportForm(FlaskForm):
+    format = wtforms.StringField(
+        validators=[v.Optional(), v.AnyOf(("csv", "ndjson"))],
+    )
+    service_id = wtforms.IntegerField(
+        validators=[v.Optional(), v.NumberRange(min=1)],
+    )
+    status = wtforms.StringField(
+        validators=[
+            v.Optional(),
+            v.AnyOf(tuple(status.value for status in RequestStatus)),
+        ],
+    )
+    user_email = wtforms.StringField(
+        validators=[v.Optional(), v.Length(min=0, max=64)],
+    )
+    start_date = wtforms.DateField(
+        format="%Y-%m-%d", validators=[v.Optional()]
+    )
+    end_date = wtforms.DateField(format="%Y-%m-%d", validators=[v.Optional()])
+
+    def values(self) -> RequestsExportFormValues:
+        return {  # type: ignore
+            "format": self.format.data or "csv",
+            "service_id": self.service_id.data,
+            "status": (
+                RequestStatus(self.status.data) if self.status.data else None
+            ),
+            "user_email": self.user_email.data or None,
+            "start_date": (
+                self.start_date.data.strftime("%Y-%m-%d")
+                if self.start_date.data
+                else None
+            ),
+            "end_date": (
+                self.end_date.data.strftime("%Y-%m-%d")
+                if self.end_date.data
+                else None
+            ),
         }
@@ -1,11 +1,17 @@
 import typing as t
 
 from flask_wtf import FlaskForm
-from wtforms import SelectField, StringField, TextAreaField
+from wtforms import (
+    SelectField,
+    SelectMultipleField,
+    StringField,
+    TextAreaField,
+)
 from wtforms import validators as v
 
 from src.core.enums import RequestStatus
 from src.services.request import (
+    BULK_STATUS_MAX_REQUESTS,
     RequestHistoryParams,
     RequestNoteParams,
     RequestParams,
@@ -73,3 +79,21 @@ class RequestHistoryForm(FlaskForm):
             "status": t.cast(RequestStatus, self.status.data),
             "observations": self.observations.data,  # type: ignore
         }
+
+
+class RequestBulkHistoryForm(RequestHistoryForm):
+    request_ids = SelectMultipleField(
+        "Solicitudes",
+        coerce=int,
+        validate_choice=False,
+        validators=[
+            v.DataRequired("Seleccione al menos una solicitud"),
+            v.Length(
+                max=BULK_STATUS_MAX_REQUESTS,
+                message=(
+                    f"Puede actualizar hasta {BULK_STATUS_MAX_REQUESTS} "
+                    "solicitudes a la vez"
+                ),
+            ),
+        ],
+    )